@@ -0,0 +1,51 @@
+from flask import Flask
+from flask_cors import CORS
+from app.extensions import db, migrate, security
+from app.models.user import user_datastore
+from app.auth.routes import auth_bp
+from app.routes.ui_routes import ui_bp
+from app.routes.api_routes import api_bp
+from app.cli import register_commands
+from app.utils.jobs import job_runner
+from app.utils.llama_index import index_manager
+from app.utils import metrics, responses
+from app.utils.database import bootstrap, configure_database, init_database
+
+def create_app():
+    app = Flask(__name__, instance_relative_config=True)
+    app.config.from_object('app.config.Config')
+    app.config.from_pyfile('config.py', silent=True)
+
+    configure_database(app)
+    db.init_app(app)
+    init_database(app)
+    migrate.init_app(app, db)
+    security.init_app(app, user_datastore)
+    job_runner.init_app(app)
+    # Request timing, query pipeline traces and /metrics
+    metrics.init_app(app)
+    # orjson responses, gzip/brotli by Accept-Encoding
+    responses.init_app(app)
+    # Schema and admin user once per process, not on every request
+    if app.config['DB_BOOTSTRAP'] == 'startup':
+        bootstrap(app)
+
+    # ✅ Enable CORS for frontend origin
+    # Add allow_headers and methods explicitly
+    CORS(
+        app,
+        origins=["https://syngent-ai.vercel.app"],
+        supports_credentials=True,
+        allow_headers=["Content-Type", "Authorization"],
+        methods=["GET", "POST", "OPTIONS"]
+    )
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(ui_bp)
+    app.register_blueprint(api_bp, url_prefix='/api')
+    register_commands(app)
+
+    # Lazy, background or pre-fork load of the document index (INDEX_LOAD)
+    index_manager.init_app(app)
+
+    return app
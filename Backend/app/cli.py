@@ -0,0 +1,102 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+vector_store_cli = AppGroup('vector-store', help='Maintain the document vector store.')
+
+
+@vector_store_cli.command('convert')
+@click.option('--persist-dir', default=None, help='Defaults to VECTORDIR.')
+@click.option('--ivf-lists', type=int, default=None, help='IVF lists (0 = ~sqrt(rows)).')
+def convert_vector_store(persist_dir, ivf_lists):
+    """Convert the JSON vector store into the memory-mapped layout."""
+    from app.utils.mmap_vector_store import convert_simple_store
+
+    persist_dir = persist_dir or current_app.config['VECTORDIR']
+    store = convert_simple_store(
+        persist_dir,
+        ivf_lists=current_app.config['VECTOR_IVF_LISTS'] if ivf_lists is None else ivf_lists,
+        nprobe=current_app.config['VECTOR_IVF_NPROBE'],
+        ivf_min_size=current_app.config['VECTOR_IVF_MIN_SIZE'],
+    )
+    click.echo(f"Converted {store.count()} vectors in {persist_dir}")
+
+
+documents_cli = AppGroup('documents', help='Manage the documents behind the vector store.')
+
+
+@documents_cli.command('ingest')
+@click.option('--docs-dir', default=None, help='Defaults to DOCS_DIR.')
+@click.option('--persist-dir', default=None, help='Defaults to VECTORDIR.')
+@click.option('--full', is_flag=True, help='Rebuild from scratch instead of applying changes.')
+def ingest_documents_command(docs_dir, persist_dir, full):
+    """Embed new or changed documents and drop deleted ones."""
+    from app.utils.doc_ingest import ingest_documents
+
+    stats = ingest_documents(docs_dir=docs_dir, persist_dir=persist_dir, full=full)
+    click.echo(', '.join(f"{key}: {value}" for key, value in stats.items()))
+
+
+database_cli = AppGroup('database', help='Database setup.')
+
+
+@database_cli.command('bootstrap')
+def bootstrap_database():
+    """Create missing tables and the admin user."""
+    from app.utils.database import bootstrap
+
+    bootstrap(current_app._get_current_object())
+    click.echo("Database ready")
+
+
+snapshot_cli = AppGroup('snapshot', help='Parquet snapshot of the orders table.')
+
+
+@snapshot_cli.command('refresh')
+def refresh_snapshot_command():
+    """Rebuild the Parquet snapshot of orders in SNAPSHOT_DIR for offline analysis."""
+    from app.utils.columnar import refresh_snapshot, snapshot_available
+
+    if not snapshot_available():
+        click.echo("Snapshot disabled (SNAPSHOT_ENABLED=false) or pyarrow not installed")
+        return
+    refresh_snapshot()
+    click.echo(f"Snapshot written to {current_app.config['SNAPSHOT_DIR']}")
+
+
+jobs_cli = AppGroup('jobs', help='Background jobs.')
+
+
+@jobs_cli.command('resume')
+def resume_jobs():
+    """Run queued jobs and those whose worker died, then exit."""
+    from app.utils.jobs import job_runner
+
+    click.echo(f"Resumed {job_runner.resume_pending()} jobs")
+    job_runner.shutdown(wait=True)
+
+
+@jobs_cli.command('worker')
+@click.option('--interval', type=float, default=None, help='Seconds between polls; defaults to JOB_POLL_SECONDS.')
+def jobs_worker(interval):
+    """Keep running queued jobs and those whose worker died, until interrupted."""
+    from app.utils.jobs import job_runner
+
+    interval = interval or current_app.config['JOB_POLL_SECONDS']
+    click.echo(f"Polling for jobs every {interval:g}s")
+    try:
+        while True:
+            job_runner.resume_pending()
+            time.sleep(interval)
+    finally:
+        job_runner.shutdown(wait=True)
+
+
+def register_commands(app):
+    app.cli.add_command(database_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(snapshot_cli)
+    app.cli.add_command(vector_store_cli)
+    app.cli.add_command(documents_cli)
@@ -2,6 +2,9 @@ import os
 from dotenv import load_dotenv
 load_dotenv("/home/syngentai/mysite/.env")
 
+# Project root (the directory holding flask_app.py)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'devkey')
     SECURITY_PASSWORD_SALT = os.getenv('SECURITY_PASSWORD_SALT', 'salt')
@@ -15,6 +18,88 @@ class Config:
     SECURITY_JWT_HEADER_NAME = 'Authorization'
     SECURITY_JWT_HEADER_TYPE = 'Bearer'
     SECURITY_JWT_EXPIRATION_DELTA = 3600
-    VECTORDIR = os.getenv('VECTORDIR', 'app/vector_store')
+    VECTORDIR = os.path.join(BASE_DIR, os.getenv('VECTORDIR', os.path.join('app', 'vector_store')))
+    INDEX_LOAD = os.getenv('INDEX_LOAD', 'background')
+    DOCS_DIR = os.getenv('DOCS_DIR', os.path.join(BASE_DIR, 'app', 'documents'))
+    DOC_CHUNK_SIZE = int(os.getenv('DOC_CHUNK_SIZE', 1024))
+    DOC_CHUNK_OVERLAP = int(os.getenv('DOC_CHUNK_OVERLAP', 100))
+    VECTOR_IVF_LISTS = int(os.getenv('VECTOR_IVF_LISTS', 0))
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', 8))
+    VECTOR_IVF_MIN_SIZE = int(os.getenv('VECTOR_IVF_MIN_SIZE', 20000))
     AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
     BEDROCK_API_KEY = os.getenv('BEDROCK_API_KEY', '')
+    MODEL_ENDPOINT_URL = os.getenv('MODEL_ENDPOINT_URL', 'https://quchnti6xu7yzw7hfzt5yjqtvi0kafsq.lambda-url.eu-central-1.on.aws/')
+    MODEL_STREAMING = os.getenv('MODEL_STREAMING', 'true').lower() == 'true'
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 60))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.5))
+    HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 8))
+    EMBED_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', 8))
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+    EMBED_RETRY_ROUNDS = int(os.getenv('EMBED_RETRY_ROUNDS', 2))
+    EMBED_CACHE_ENABLED = os.getenv('EMBED_CACHE_ENABLED', 'true').lower() == 'true'
+    EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', os.path.join(BASE_DIR, 'app', 'cache', 'embeddings.sqlite3'))
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv('EMBED_CACHE_MAX_ENTRIES', 200000))
+    EMBED_CACHE_HOT_SIZE = int(os.getenv('EMBED_CACHE_HOT_SIZE', 2048))
+    # Concurrent query embeddings and classifier prompts are coalesced into
+    # batches: up to MICROBATCH_MAX_SIZE items or MICROBATCH_WAIT_MS of waiting
+    MICROBATCH_ENABLED = os.getenv('MICROBATCH_ENABLED', 'true').lower() == 'true'
+    MICROBATCH_MAX_SIZE = int(os.getenv('MICROBATCH_MAX_SIZE', 32))
+    MICROBATCH_WAIT_MS = float(os.getenv('MICROBATCH_WAIT_MS', 5))
+    MICROBATCH_WORKERS = int(os.getenv('MICROBATCH_WORKERS', 4))
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1000))
+    INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 5000))
+    INGEST_UPSERT = os.getenv('INGEST_UPSERT', 'true').lower() == 'true'
+    CSV_FILE_PATH = os.getenv('CSV_FILE_PATH', os.path.join(BASE_DIR, 'app', 'csv_file', 'table.csv'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+    JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 5))
+    SQL_MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', 200))
+    SQL_TIMEOUT_SECONDS = float(os.getenv('SQL_TIMEOUT_SECONDS', 10))
+    SQL_CACHE_SIZE = int(os.getenv('SQL_CACHE_SIZE', 256))
+    ROUTER_MODE = os.getenv('ROUTER_MODE', 'speculative')
+    ROUTER_RETRIEVAL_TIMEOUT = float(os.getenv('ROUTER_RETRIEVAL_TIMEOUT', 15))
+    ROUTER_MAX_TOKENS = int(os.getenv('ROUTER_MAX_TOKENS', 800))
+    CONTEXT_RETRIEVE_K = int(os.getenv('CONTEXT_RETRIEVE_K', 12))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1800))
+    CONTEXT_LEXICAL_WEIGHT = float(os.getenv('CONTEXT_LEXICAL_WEIGHT', 0.3))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', 0.92))
+    CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv('CONTEXT_MIN_CHUNK_TOKENS', 48))
+    SOURCE_SNIPPET_CHARS = int(os.getenv('SOURCE_SNIPPET_CHARS', 300))
+    SOURCE_METADATA_KEYS = [k for k in os.getenv('SOURCE_METADATA_KEYS', 'file_name,page_label').split(',') if k]
+    COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    HYBRID_TOP_K = int(os.getenv('HYBRID_TOP_K', 4))
+    HYBRID_DOC_TIMEOUT = float(os.getenv('HYBRID_DOC_TIMEOUT', 15))
+    HYBRID_SQL_TIMEOUT = float(os.getenv('HYBRID_SQL_TIMEOUT', 20))
+    HYBRID_WORKERS = int(os.getenv('HYBRID_WORKERS', 8))
+    CLASSIFIER_CONFIDENCE = float(os.getenv('CLASSIFIER_CONFIDENCE', 0.8))
+    CLASSIFIER_MIN_EXAMPLES = int(os.getenv('CLASSIFIER_MIN_EXAMPLES', 30))
+    CLASSIFIER_RETRAIN_EVERY = int(os.getenv('CLASSIFIER_RETRAIN_EVERY', 25))
+    CLASSIFIER_MAX_EXAMPLES = int(os.getenv('CLASSIFIER_MAX_EXAMPLES', 5000))
+    CLASSIFIER_CACHE_SIZE = int(os.getenv('CLASSIFIER_CACHE_SIZE', 1024))
+    SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(BASE_DIR, 'app', 'snapshots', 'orders'))
+    # Per-request JSON traces of the query pipeline, one line each; empty disables
+    TRACE_LOG = os.getenv('TRACE_LOG', '')
+    TRACE_PATHS = [p for p in os.getenv('TRACE_PATHS', '/api/query').split(',') if p]
+    # Tables and the admin user: created at startup, or only by `flask database bootstrap` when 'off'
+    DB_BOOTSTRAP = os.getenv('DB_BOOTSTRAP', 'startup')
+    ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@example.com')
+    ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin1234')
+    # Connection pool for server databases (PostgreSQL, MySQL); SQLite uses the pragmas below
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'true').lower() == 'true'
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
@@ -1,6 +1,7 @@
 from app.extensions import db
 from flask_security import UserMixin, RoleMixin
 import uuid
+import json
 
 roles_users = db.Table('roles_users',
     db.Column('user_id', db.Integer(), db.ForeignKey('user.id')),
@@ -32,15 +33,15 @@ class Order(db.Model):
     days_for_shipment_scheduled = db.Column(db.Integer)
     benefit_per_order = db.Column(db.Float)
     sales_per_customer = db.Column(db.Float)
-    delivery_status = db.Column(db.String(50))
+    delivery_status = db.Column(db.String(50), index=True)
     late_delivery_risk = db.Column(db.Integer)
-    category_id = db.Column(db.Integer)
+    category_id = db.Column(db.Integer, index=True)
     category_name = db.Column(db.String(100))
     customer_city = db.Column(db.String(100))
     customer_country = db.Column(db.String(100))
     customer_email = db.Column(db.String(100))
     customer_fname = db.Column(db.String(100))
-    customer_id = db.Column(db.Integer)
+    customer_id = db.Column(db.Integer, index=True)
     customer_lname = db.Column(db.String(100))
     customer_password = db.Column(db.String(100))
     customer_segment = db.Column(db.String(50))
@@ -51,11 +52,11 @@ class Order(db.Model):
     department_name = db.Column(db.String(100))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
-    market = db.Column(db.String(100))
+    market = db.Column(db.String(100), index=True)
     order_city = db.Column(db.String(100))
     order_country = db.Column(db.String(100))
     order_customer_id = db.Column(db.Integer)
-    order_date = db.Column(db.DateTime)
+    order_date = db.Column(db.DateTime, index=True)
     order_id = db.Column(db.Integer, unique=True)
     order_item_cardprod_id = db.Column(db.Integer)
     order_item_discount = db.Column(db.Float)
@@ -67,7 +68,7 @@ class Order(db.Model):
     sales = db.Column(db.Float)
     order_item_total = db.Column(db.Float)
     order_profit_per_order = db.Column(db.Float)
-    order_region = db.Column(db.String(100))
+    order_region = db.Column(db.String(100), index=True)
     order_state = db.Column(db.String(100))
     order_status = db.Column(db.String(50))
     order_zipcode = db.Column(db.Float, nullable=True)
@@ -79,12 +80,122 @@ class Order(db.Model):
     product_price = db.Column(db.Float)
     product_status = db.Column(db.Integer)
     shipping_date = db.Column(db.DateTime)
-    shipping_mode = db.Column(db.String(50))
+    shipping_mode = db.Column(db.String(50), index=True)
 
     def __repr__(self):
         return f"<Order {self.order_id}>"
 
 
+# Fingerprint of each CSV source for incremental ingestion, one row per file
+class IngestionState(db.Model):
+    __tablename__ = 'ingestion_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(500), unique=True, nullable=False)
+    file_size = db.Column(db.BigInteger)
+    file_mtime = db.Column(db.Float)
+    content_hash = db.Column(db.String(64))
+    chunk_size = db.Column(db.Integer)
+    chunk_hashes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<IngestionState {self.source}>"
+
+
+# Materialized data cube over the main order dimensions at month grain
+# (see app/utils/rollups.py). Coarser group-bys are sums over these cells.
+class OrderRollup(db.Model):
+    __tablename__ = 'order_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_year = db.Column(db.Integer)
+    order_month = db.Column(db.Integer)
+    market = db.Column(db.String(100), index=True)
+    order_region = db.Column(db.String(100), index=True)
+    category_name = db.Column(db.String(100), index=True)
+    shipping_mode = db.Column(db.String(50), index=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    sales_sum = db.Column(db.Float)
+    profit_sum = db.Column(db.Float)
+    late_risk_sum = db.Column(db.Integer)
+    late_delivery_count = db.Column(db.Integer)
+    days_real_sum = db.Column(db.Integer)
+    shipping_delay_sum = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_order_rollups_year_month', 'order_year', 'order_month'),
+    )
+
+
+# Background job queue (see app/utils/jobs.py)
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text)
+    rows_total = db.Column(db.Integer)
+    rows_processed = db.Column(db.Integer, default=0)
+    success_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Renewed by the worker running the job; once it lapses the job may be reclaimed
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    # Set while an enqueue_once job is queued/running, so duplicates fail the unique index
+    active_key = db.Column(db.String(40), unique=True, index=True)
+
+    def to_dict(self):
+        rate = eta = None
+        if self.started_at and self.rows_processed:
+            elapsed = ((self.finished_at or self.updated_at) - self.started_at).total_seconds()
+            if elapsed > 0:
+                rate = self.rows_processed / elapsed
+                if self.rows_total and self.status == 'running':
+                    eta = max(self.rows_total - self.rows_processed, 0) / rate
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'rows_total': self.rows_total,
+            'rows_processed': self.rows_processed,
+            'rows_per_sec': round(rate, 1) if rate else None,
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+            'success_count': self.success_count,
+            'error_count': self.error_count,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+# Query labels decided by the LLM classifier; training data for the local
+# fast-path model in app/utils/text_classifier.py
+class QueryLabel(db.Model):
+    __tablename__ = 'query_labels'
+
+    id = db.Column(db.Integer, primary_key=True)
+    question = db.Column(db.Text, nullable=False)
+    normalized = db.Column(db.String(1000), nullable=False, index=True)
+    label = db.Column(db.String(20), nullable=False)
+    source = db.Column(db.String(20), nullable=False, default='llm')
+    created_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<QueryLabel {self.label} {self.normalized[:40]}>"
+
+
 # # Define SQLAlchemy Models (Normalized Schema)
 # class Customer(db.Model):
 #     __tablename__ = 'customers'
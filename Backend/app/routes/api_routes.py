@@ -14,14 +14,96 @@
 #         })
 
 
-from flask import Blueprint, request, jsonify
+import logging
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from app.utils.query_classifier import queryClassifier
-from app.utils.llama_index import query_documents
+from app.utils.llama_index import get_source, index_manager, query_documents, stream_documents
+from app.utils.langchain_sql import query_sql
+from app.utils.hybrid import query_hybrid, stream_hybrid
+from app.utils.router import route_query
+from app.utils.metrics import span
+from sqlalchemy.exc import SQLAlchemyError
 
 from flask_cors import cross_origin
 
 api_bp = Blueprint('api', __name__)
 
+logger = logging.getLogger(__name__)
+
+
+def _stream_format():
+    """'sse' or 'ndjson' when the client asked for a streamed answer, else None."""
+    data = request.get_json(silent=True) or {}
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if data.get('stream'):
+        return 'sse' if data.get('stream') == 'sse' else 'ndjson'
+    return None
+
+
+def _encode_event(fmt, event, data):
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+    return current_app.json.dumps({'event': event, 'data': data}) + "\n"
+
+
+def _stream_response(fmt, query_type, events):
+    """
+    Stream (event, data) pairs to the client as they are produced. Errors after
+    the first byte can no longer change the status code, so they become an
+    'error' event.
+    """
+    def generate():
+        yield _encode_event(fmt, 'type', query_type)
+        try:
+            for event, data in events:
+                yield _encode_event(fmt, event, data)
+        except Exception as e:
+            logger.exception(f"Streaming {query_type} answer failed")
+            yield _encode_event(fmt, 'error', str(e))
+
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _sql_events(query_text):
+    try:
+        result = query_sql(query_text)
+    except (ValueError, SQLAlchemyError) as e:
+        yield 'error', f'Could not answer from the orders data: {e}'
+        return
+    except RuntimeError as e:
+        # TransportError: the model endpoint failed, as in the non-streamed 502
+        yield 'error', f'Could not answer the question: {e}'
+        return
+    yield 'result', result
+    yield 'done', {'cached': result['cached']}
+
+
+@api_bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the document index is loaded, 503 before that."""
+    status = index_manager.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@api_bp.route('/sources/<source_id>', methods=['GET'])
+@cross_origin(origins="https://syngent-ai.vercel.app")
+def source(source_id):
+    """Full text of a source returned (as an excerpt) by /api/query."""
+    node = get_source(source_id)
+    if node is None:
+        return jsonify({'error': 'Unknown source'}), 404
+    response = jsonify(node)
+    # Node ids are never reused for different text, so the client may keep it
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
 
 @api_bp.route('/query', methods=['POST', 'OPTIONS'])
 @cross_origin(origins="https://syngent-ai.vercel.app", allow_headers=["Content-Type"])
@@ -31,16 +113,57 @@ def query():
         query_text = data.get('query', '')
         context = data.get('context', {})
 
-        query_type = queryClassifier(query_text)
+        stream_format = _stream_format()
+        routed = None
+        if current_app.config['ROUTER_MODE'] == 'speculative' and not stream_format:
+            # Retrieval feeds the classifying LLM call; document answers may come back finished
+            query_type, routed = route_query(query_text)
+        else:
+            with span('classify') as attrs:
+                query_type = attrs['label'] = queryClassifier(query_text)
+
+        if stream_format and query_type == 'document':
+            return _stream_response(stream_format, query_type, stream_documents(query_text))
+
+        if stream_format and query_type == 'sql':
+            return _stream_response(stream_format, query_type, _sql_events(query_text))
+
+        if stream_format and query_type == 'hybrid':
+            return _stream_response(stream_format, query_type, stream_hybrid(query_text))
 
         if query_type == 'document':
-            result = query_documents(query_text)
+            result = routed or query_documents(query_text)
             return jsonify({
                 'answer': result["answer"],
                 'sources': result["sources"],
+                'cached': result.get("cached", False),
                 'type': 'document'
             })
 
+        if query_type == 'sql':
+            try:
+                result = query_sql(query_text)
+            except (ValueError, SQLAlchemyError) as e:
+                return jsonify({'error': f'Could not answer from the orders data: {e}'}), 422
+            except RuntimeError as e:
+                return jsonify({'error': f'Could not answer the question: {e}'}), 502
+            return jsonify({
+                'answer': result['answer'],
+                'sql': result['sql'],
+                'columns': result['columns'],
+                'rows': result['rows'],
+                'truncated': result['truncated'],
+                'cached': result['cached'],
+                'type': 'sql'
+            })
+
+        if query_type == 'hybrid':
+            try:
+                result = query_hybrid(query_text)
+            except RuntimeError as e:
+                return jsonify({'error': f'Could not answer the question: {e}'}), 502
+            return jsonify({**result, 'type': 'hybrid'})
+
         return jsonify({'error': 'Unrecognized query type'}), 400
 
     return jsonify({'error': 'Unsupported Content-Type'}), 415
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import time
+
+
+def staging_directory(target):
+    """Empty sibling directory of target to build a new version in."""
+    target = os.path.abspath(target).rstrip(os.sep)
+    parent, name = os.path.split(target)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f'.{name}-tmp-', dir=parent)
+    os.chmod(tmp, 0o755)
+    return tmp
+
+
+def _version_ns(entry, prefix):
+    """Creation time (ns) encoded in a version directory name, or None."""
+    if not entry.startswith(prefix):
+        return None
+    stamp = entry[len(prefix):].split('-')[0]
+    return int(stamp) if stamp.isdigit() else None
+
+
+def _remove_old_versions(parent, name, keep):
+    """
+    Delete versions older than every one in keep. Newer ones may belong to a
+    concurrent writer that has not swapped its version in yet.
+    """
+    prefix = f'.{name}-v'
+    floor = min(_version_ns(os.path.basename(path), prefix) or 0 for path in keep if path)
+    for entry in os.listdir(parent):
+        stamp = _version_ns(entry, prefix)
+        if stamp is not None and stamp < floor:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def publish_directory(staged, target):
+    """
+    Turn a staging_directory into a versioned sibling (.<name>-v<ns>) and
+    point the target symlink at it with os.replace. The swap is atomic, so
+    target always holds a complete version; readers should resolve it once
+    (os.path.realpath) before reading several files. The previous version
+    stays on disk for readers still on it, older ones are removed.
+    Returns: path of the new version.
+    """
+    target = os.path.abspath(target).rstrip(os.sep)
+    parent, name = os.path.split(target)
+    version = os.path.join(parent, f'.{name}-v{time.time_ns()}')
+    os.rename(staged, version)
+
+    previous = os.path.realpath(target) if os.path.islink(target) else None
+    if os.path.isdir(target) and previous is None:
+        # A plain directory from before versioned layouts: moving it aside is
+        # the one step that is not atomic, and happens once
+        previous = version + '-legacy'
+        os.rename(target, previous)
+    link = os.path.join(parent, f'.{name}-link-{time.time_ns()}')
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, target)
+    _remove_old_versions(parent, name, keep={version, previous})
+    return version
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, extract, select
+from sqlalchemy import types as sa_types
+
+from app.extensions import db
+from app.models.user import Order
+from app.utils.atomic_dir import publish_directory, staging_directory
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs as pa_fs
+except ImportError:  # pragma: no cover - snapshot is optional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '_manifest.json'
+# Orders without an order_date live in this partition
+NULL_PARTITION = (0, 0)
+
+_dataset = None
+_dataset_version = None
+_dataset_lock = threading.Lock()
+
+
+def snapshot_available():
+    return pa is not None and current_app.config['SNAPSHOT_ENABLED']
+
+
+def _arrow_type(column_type):
+    if isinstance(column_type, sa_types.Integer):
+        return pa.int64()
+    if isinstance(column_type, sa_types.Float):
+        return pa.float64()
+    if isinstance(column_type, sa_types.DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def _schema():
+    return pa.schema([(c.name, _arrow_type(c.type)) for c in Order.__table__.columns])
+
+
+def _partition_dir(root, year, month):
+    return os.path.join(root, f'order_year={year}', f'order_month={month}')
+
+
+def _month_rows(year, month):
+    """All orders rows for one month as an Arrow table (columnar, typed)."""
+    table = Order.__table__
+    if (year, month) == NULL_PARTITION:
+        cond = table.c.order_date.is_(None)
+    else:
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        cond = and_(table.c.order_date >= start, table.c.order_date < end)
+    result = db.session.execute(select(table).where(cond))
+    names = list(result.keys())
+    rows = result.fetchall()
+    columns = list(zip(*rows)) if rows else [[] for _ in names]
+    schema = _schema()
+    return pa.Table.from_arrays(
+        [pa.array(list(col), type=schema.field(name).type) for name, col in zip(names, columns)],
+        schema=schema,
+    )
+
+
+def _write_partition(root, year, month):
+    """Replace one month's Parquet file atomically; drop it if the month is now empty."""
+    part_dir = _partition_dir(root, year, month)
+    target = os.path.join(part_dir, 'part-0.parquet')
+    table = _month_rows(year, month)
+    if table.num_rows == 0:
+        if os.path.exists(target):
+            os.remove(target)
+        return 0
+    os.makedirs(part_dir, exist_ok=True)
+    tmp = target + '.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, target)
+    return table.num_rows
+
+
+def _all_months():
+    year = extract('year', Order.order_date)
+    month = extract('month', Order.order_date)
+    rows = db.session.query(year, month).group_by(year, month).all()
+    return [(int(y), int(m)) if y is not None else NULL_PARTITION for y, m in rows]
+
+
+def _write_manifest(root):
+    tmp = os.path.join(root, MANIFEST + '.tmp')
+    with open(tmp, 'w') as fh:
+        json.dump({'version': time.time()}, fh)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+
+def _rebuild(root):
+    """Write every month into a staging directory and publish it as the new snapshot."""
+    months = set(_all_months())
+    staged = staging_directory(root)
+    try:
+        rows = sum(_write_partition(staged, year, month) for year, month in sorted(months))
+        _write_manifest(staged)
+    except Exception:
+        shutil.rmtree(staged, ignore_errors=True)
+        raise
+    publish_directory(staged, root)
+    return rows, months
+
+
+def refresh_snapshot(months=None):
+    """
+    Write the orders table as Parquet partitioned by order_year/order_month,
+    for offline analysis (`flask snapshot refresh`). With months only those
+    partitions are rewritten in place; a full rebuild (or a missing snapshot)
+    is built aside and swapped in, so readers never see it half written.
+    """
+    if not snapshot_available():
+        return
+    root = current_app.config['SNAPSHOT_DIR']
+    if not os.path.exists(os.path.join(root, MANIFEST)):
+        months = None
+    elif months is not None and not months:
+        return
+
+    started = time.monotonic()
+    if months is None:
+        rows, months = _rebuild(root)
+    else:
+        months = {NULL_PARTITION if year is None else (year, month) for year, month in months}
+        rows = sum(_write_partition(root, year, month) for year, month in sorted(months))
+        _write_manifest(root)
+    logger.info(f"Wrote {rows} rows to {len(months)} snapshot partition(s) "
+                f"in {time.monotonic() - started:.2f}s")
+
+
+def get_dataset():
+    """Memory-mapped dataset over the snapshot, rediscovered when the manifest changes."""
+    global _dataset, _dataset_version
+    root = current_app.config['SNAPSHOT_DIR']
+    manifest = os.path.join(root, MANIFEST)
+    if pa is None or not os.path.exists(manifest):
+        return None
+    version = os.stat(manifest).st_mtime_ns
+    with _dataset_lock:
+        if _dataset is None or version != _dataset_version:
+            # Resolved once: file paths stay on this version across a swap
+            _dataset = ds.dataset(
+                os.path.realpath(root),
+                format='parquet',
+                partitioning='hive',
+                filesystem=pa_fs.LocalFileSystem(use_mmap=True),
+                exclude_invalid_files=True,
+            )
+            _dataset_version = version
+        return _dataset
+
+
+def _filter_expression(filters):
+    expression = None
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            term = ds.field(column).isin(list(value))
+        else:
+            term = ds.field(column) == value
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def scan(columns=None, filters=None):
+    """
+    Read only the requested columns. filters is {column: value or list};
+    order_year/order_month filters prune whole partitions.
+    Returns: pyarrow.Table, or None when no snapshot exists.
+    """
+    dataset = get_dataset()
+    if dataset is None:
+        return None
+    return dataset.to_table(columns=columns, filter=_filter_expression(filters))
+
+
+def aggregate(group_by, metrics, filters=None):
+    """
+    Group-by over the snapshot, e.g.
+        aggregate(['market'], {'sales': 'sum', 'late_delivery_risk': 'mean'})
+    Returns: list of dicts, or None when no snapshot exists.
+    """
+    columns = list(dict.fromkeys(list(group_by) + list(metrics)))
+    table = scan(columns=columns, filters=filters)
+    if table is None:
+        return None
+    result = table.group_by(list(group_by)).aggregate(list(metrics.items()))
+    return result.to_pylist()
+
+
+def count_rows(filters=None):
+    dataset = get_dataset()
+    if dataset is None:
+        return None
+    return dataset.count_rows(filter=_filter_expression(filters))
+
+
+def column_stats(column, filters=None):
+    """min/max/mean/sum of one numeric column without materialising other columns."""
+    table = scan(columns=[column], filters=filters)
+    if table is None:
+        return None
+    values = table.column(column)
+    return {
+        'min': pc.min(values).as_py(),
+        'max': pc.max(values).as_py(),
+        'mean': pc.mean(values).as_py(),
+        'sum': pc.sum(values).as_py(),
+    }
@@ -0,0 +1,193 @@
+import logging
+import re
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from app.config import Config
+from app.utils.metrics import span
+from app.utils.text_classifier import TOKEN
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def words(text):
+    return TOKEN.findall(text.lower())
+
+
+def bm25_scores(query_terms, documents):
+    """BM25 of each tokenized document for the query, with IDF taken over the candidates themselves."""
+    terms = sorted(set(query_terms))
+    if not terms or not documents:
+        return np.zeros(len(documents))
+    tf = np.array([[doc.count(term) for term in terms] for doc in documents], dtype=float)
+    lengths = np.array([len(doc) for doc in documents], dtype=float)
+    df = (tf > 0).sum(axis=0)
+    n = len(documents)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def _minmax(values):
+    values = np.asarray(values, dtype=float)
+    span_ = values.max() - values.min() if values.size else 0.0
+    return (values - values.min()) / span_ if span_ > 0 else np.ones_like(values)
+
+
+def vector_lookup(vector_store):
+    """Callable mapping node ids to stored embeddings (None where unknown), or None if the store cannot."""
+    if hasattr(vector_store, 'vectors_for'):
+        return vector_store.vectors_for
+    data = getattr(vector_store, 'data', None)
+    if data is not None and hasattr(data, 'embedding_dict'):
+        return lambda node_ids: [data.embedding_dict.get(node_id) for node_id in node_ids]
+    return None
+
+
+def compress(text, query_terms, budget):
+    """
+    The sentences of text that share the most words with the query, kept in
+    their original order, within budget tokens. Falls back to a prefix cut
+    at a word boundary when the text has no sentence breaks.
+    """
+    sentences = [s for s in SENTENCE_END.split(text.strip()) if s]
+    if len(sentences) <= 1:
+        cut = text[:budget * 4]
+        return cut.rsplit(' ', 1)[0] if len(cut) < len(text) and ' ' in cut else cut
+    wanted = set(query_terms)
+    overlap = [len(wanted.intersection(words(s))) for s in sentences]
+    # Best overlap first; earlier sentences win ties, since they often introduce the topic
+    order = sorted(range(len(sentences)), key=lambda i: (-overlap[i], i))
+    chosen, used = [], 0
+    for i in order:
+        cost = estimate_tokens(sentences[i])
+        if used + cost > budget:
+            continue
+        chosen.append(i)
+        used += cost
+    return ' '.join(sentences[i] for i in sorted(chosen))
+
+
+def snippet(text, query_terms, max_chars):
+    """
+    (excerpt, truncated): about max_chars of text starting at the sentence that
+    shares the most words with the query, cut at word boundaries and marked
+    with ellipses where text was left out.
+    """
+    text = ' '.join(text.split())
+    if len(text) <= max_chars:
+        return text, False
+    starts = [0] + [m.end() for m in SENTENCE_END.finditer(text)]
+    wanted = set(query_terms)
+    overlap = [len(wanted.intersection(words(text[a:b])))
+               for a, b in zip(starts, starts[1:] + [len(text)])]
+    start = starts[max(range(len(starts)), key=lambda i: (overlap[i], -i))]
+    # Keep the window full when the best sentence is near the end
+    start = min(start, len(text) - max_chars)
+    if start > 0 and text[start - 1] != ' ':
+        start = text.find(' ', start) + 1
+    end = start + max_chars
+    excerpt = text[start:end]
+    if end < len(text) and ' ' in excerpt:
+        excerpt = excerpt.rsplit(' ', 1)[0]
+    return ('…' if start > 0 else '') + excerpt + ('…' if end < len(text) else ''), True
+
+
+class ContextBudget(BaseNodePostprocessor):
+    """
+    Retrieval-to-prompt stage for over-retrieved nodes:
+      1. re-rank by a blend of the vector score (cosine) and BM25 over the candidates,
+      2. drop near-duplicates (cosine between stored chunk vectors, or word
+         overlap when the store cannot return vectors),
+      3. fill token_budget in rank order, compressing the chunk that does not
+         fit whole down to its most query-relevant sentences.
+    """
+
+    token_budget: int = Field(default=1800, description="Estimated tokens of context sent to the LLM")
+    lexical_weight: float = Field(default=0.3, description="Share of BM25 in the blended score")
+    dedup_threshold: float = Field(default=0.92, description="Similarity above which a chunk is a duplicate")
+    min_chunk_tokens: int = Field(default=48, description="Smallest compressed fragment worth including")
+    _lookup: Optional[Callable[[List[str]], List[Any]]] = PrivateAttr(default=None)
+
+    def __init__(self, lookup=None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._lookup = lookup
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextBudget"
+
+    @classmethod
+    def from_config(cls, config=Config, lookup=None):
+        return cls(lookup=lookup, token_budget=config.CONTEXT_TOKEN_BUDGET,
+                   lexical_weight=config.CONTEXT_LEXICAL_WEIGHT,
+                   dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD,
+                   min_chunk_tokens=config.CONTEXT_MIN_CHUNK_TOKENS)
+
+    def _rank(self, nodes, query_terms):
+        texts = [words(n.node.get_content()) for n in nodes]
+        dense = _minmax([n.score or 0.0 for n in nodes])
+        lexical = _minmax(bm25_scores(query_terms, texts))
+        blended = (1 - self.lexical_weight) * dense + self.lexical_weight * lexical
+        return [nodes[i] for i in np.argsort(-blended, kind='stable')]
+
+    def _duplicates(self, nodes):
+        """Indexes (in nodes' order) that nearly repeat an earlier, better-ranked node."""
+        vectors = self._lookup([n.node.node_id for n in nodes]) if self._lookup else None
+        if vectors is not None and all(v is not None for v in vectors):
+            matrix = np.asarray(vectors, dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            similarity = matrix @ matrix.T
+        else:
+            sets = [set(words(n.node.get_content())) for n in nodes]
+            similarity = np.array([[len(a & b) / max(len(a | b), 1) for b in sets] for a in sets])
+        dropped = set()
+        for i in range(len(nodes)):
+            if i in dropped:
+                continue
+            for j in range(i + 1, len(nodes)):
+                if similarity[i, j] >= self.dedup_threshold:
+                    dropped.add(j)
+        return dropped
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+        query_terms = words(query_bundle.query_str) if query_bundle else []
+        with span('rerank', candidates=len(nodes)) as attrs:
+            ranked = self._rank(nodes, query_terms)
+            duplicates = self._duplicates(ranked)
+            kept, used = [], 0
+            for i, node in enumerate(ranked):
+                if i in duplicates:
+                    continue
+                text = node.node.get_content()
+                cost = estimate_tokens(text)
+                remaining = self.token_budget - used
+                if cost > remaining:
+                    if remaining < self.min_chunk_tokens and kept:
+                        continue
+                    text = compress(text, query_terms, max(remaining, self.min_chunk_tokens))
+                    if not text:
+                        continue
+                    node = NodeWithScore(node=node.node.model_copy(update={'text': text}), score=node.score)
+                    cost = estimate_tokens(text)
+                kept.append(node)
+                used += cost
+            attrs.update(kept=len(kept), duplicates=len(duplicates), tokens=used,
+                         tokens_in=sum(estimate_tokens(n.node.get_content()) for n in nodes))
+        return kept
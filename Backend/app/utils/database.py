@@ -0,0 +1,102 @@
+import logging
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database. Server databases get
+    a sized pool with pre-ping and recycling; SQLite keeps SQLAlchemy's defaults
+    and is tuned per connection instead (see sqlite_pragmas).
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return options
+    defaults = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+    return {**defaults, **options}
+
+
+def sqlite_pragmas(config):
+    """
+    PRAGMAs run on every new SQLite connection. WAL lets readers (queries) and
+    the single writer (ingestion) proceed at the same time; synchronous=NORMAL
+    is durable across application crashes in WAL mode; busy_timeout makes a
+    second writer wait instead of failing with "database is locked".
+    """
+    pragmas = []
+    if config['SQLITE_WAL']:
+        pragmas.append('journal_mode = WAL')
+    pragmas += [
+        f"synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative cache_size is in KiB rather than pages
+        f"cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        'temp_store = MEMORY',
+    ]
+    return pragmas
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+    finally:
+        cursor.close()
+
+
+def configure_database(app):
+    """Engine options; call before db.init_app(app)."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+
+def init_database(app):
+    """Per-connection SQLite tuning; call after db.init_app(app)."""
+    if not is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    with app.app_context():
+        event.listen(db.engine, 'connect', partial(_apply_pragmas, sqlite_pragmas(app.config)))
+
+
+def bootstrap(app):
+    """
+    Create missing tables and the default admin user. Runs once per process
+    at startup (DB_BOOTSTRAP=startup) or through `flask database bootstrap`;
+    safe to race with other workers doing the same.
+    """
+    from app.models.user import user_datastore
+
+    with app.app_context():
+        try:
+            db.create_all()
+        except OperationalError as e:
+            # Another worker created the tables between the existence check and CREATE
+            logger.info(f"Schema bootstrap raced another process: {e.orig}")
+            db.session.rollback()
+        email = app.config['ADMIN_EMAIL']
+        if email and not user_datastore.find_user(email=email):
+            try:
+                user_datastore.create_user(email=email, password=app.config['ADMIN_PASSWORD'])
+                db.session.commit()
+                logger.info(f"Created admin user {email}")
+            except IntegrityError:
+                db.session.rollback()
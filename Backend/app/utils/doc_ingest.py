@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from flask import current_app
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+
+from app.utils.atomic_dir import publish_directory, staging_directory
+from app.utils.vector_index import load_index, new_index
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FNAME = 'doc_manifest.json'
+# Files read, chunked and embedded per round; bounds memory on large refreshes
+FILE_BATCH_SIZE = 16
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(persist_dir):
+    """{relative path: {sha256, size, mtime, doc_ids}} recorded by the last ingestion, or None."""
+    try:
+        with open(os.path.join(persist_dir, MANIFEST_FNAME)) as fh:
+            return json.load(fh)['files']
+    except FileNotFoundError:
+        return None
+
+
+def scan_documents(docs_dir, previous=None):
+    """
+    Current state of every file under docs_dir. Files whose size and mtime
+    match the previous manifest keep their recorded hash instead of being re-read.
+    """
+    previous = previous or {}
+    files = {}
+    for root, dirs, names in os.walk(docs_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(names):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, docs_dir)
+            stat = os.stat(path)
+            known = previous.get(rel)
+            if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                sha = known['sha256']
+            else:
+                sha = _hash_file(path)
+            files[rel] = {'sha256': sha, 'size': stat.st_size, 'mtime': stat.st_mtime, 'doc_ids': []}
+    return files
+
+
+def diff_manifest(old, new):
+    """(added, changed, removed) relative paths."""
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    changed = sorted(rel for rel in set(new) & set(old) if new[rel]['sha256'] != old[rel]['sha256'])
+    return added, changed, removed
+
+
+def _persist_atomically(index, persist_dir, files):
+    """
+    Persist into a staging directory and publish it as a new version behind
+    the persist_dir symlink (see atomic_dir), so persist_dir always holds a
+    complete store.
+    """
+    tmp = staging_directory(persist_dir)
+    try:
+        index.storage_context.persist(persist_dir=tmp)
+        with open(os.path.join(tmp, MANIFEST_FNAME), 'w') as fh:
+            json.dump({'updated_at': time.time(), 'files': files}, fh)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    publish_directory(tmp, persist_dir)
+
+
+def ingest_documents(docs_dir=None, persist_dir=None, full=False, progress=None):
+    """
+    Bring the vector store in line with docs_dir: chunk and embed only new or
+    changed files, drop the vectors of changed and deleted ones, then persist
+    atomically. A store without a manifest (built offline) is rebuilt in full
+    once. Returns: dict of counts.
+    """
+    docs_dir = docs_dir or current_app.config['DOCS_DIR']
+    persist_dir = persist_dir or current_app.config['VECTORDIR']
+    chunk_size = current_app.config['DOC_CHUNK_SIZE']
+    chunk_overlap = current_app.config['DOC_CHUNK_OVERLAP']
+    started = time.monotonic()
+
+    old = None if full else load_manifest(persist_dir)
+    current = scan_documents(docs_dir, old)
+    if old is None:
+        if not current and os.path.exists(persist_dir):
+            raise ValueError(f"No documents found in {docs_dir}; refusing to replace {persist_dir}")
+        logger.info(f"Rebuilding vector store from {len(current)} files in {docs_dir}")
+        index, old = new_index(), {}
+    else:
+        index = None
+    added, changed, removed = diff_manifest(old, current)
+    stats = {'added': len(added), 'changed': len(changed), 'removed': len(removed),
+             'unchanged': len(current) - len(added) - len(changed), 'chunks': 0}
+    for rel in current:
+        if rel in old and rel not in changed:
+            current[rel]['doc_ids'] = old[rel]['doc_ids']
+
+    if not (added or changed or removed) and index is None:
+        logger.info("Documents unchanged, vector store left as is")
+        return stats
+    if index is None:
+        index = load_index(persist_dir)
+
+    for rel in changed + removed:
+        for doc_id in old[rel]['doc_ids']:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+    to_load = added + changed
+    if progress:
+        progress(rows_total=len(to_load), force=True)
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for start in range(0, len(to_load), FILE_BATCH_SIZE):
+        batch = to_load[start:start + FILE_BATCH_SIZE]
+        paths = {os.path.abspath(os.path.join(docs_dir, rel)): rel for rel in batch}
+        documents = SimpleDirectoryReader(input_files=list(paths), filename_as_id=True).load_data()
+        for document in documents:
+            rel = paths.get(os.path.abspath(document.metadata.get('file_path', '')))
+            if rel is not None:
+                current[rel]['doc_ids'].append(document.doc_id)
+        nodes = splitter.get_nodes_from_documents(documents)
+        # Embeds through Settings.embed_model: concurrent, and cached for unchanged chunks
+        index.insert_nodes(nodes)
+        stats['chunks'] += len(nodes)
+        if progress:
+            progress(rows_processed=start + len(batch), success_count=stats['chunks'])
+
+    _persist_atomically(index, persist_dir, current)
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    logger.info(f"Vector store refreshed: {stats}")
+    return stats
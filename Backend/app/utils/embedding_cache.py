@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from app.config import Config
+from app.utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps bound parameters per statement
+LOOKUP_BATCH_SIZE = 900
+# Evict this fraction below max_entries at once so eviction is not run on every insert
+EVICT_SLACK = 0.05
+
+
+def normalize_text(text):
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(model_id, text):
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store: vectors live in SQLite as float32 blobs
+    keyed by (model_id, sha256 of the normalized text), with an in-process LRU
+    hot tier in front. The disk tier is bounded to max_entries, evicting the
+    least recently used rows.
+    """
+
+    def __init__(self, path, max_entries=200000, hot_size=2048):
+        self.path = path
+        self.max_entries = max_entries
+        self.hot = LRUCache(maxsize=hot_size)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._count = None
+
+    @classmethod
+    def from_config(cls, config=Config):
+        if not config.EMBED_CACHE_ENABLED:
+            return None
+        return cls(config.EMBED_CACHE_PATH, config.EMBED_CACHE_MAX_ENTRIES, config.EMBED_CACHE_HOT_SIZE)
+
+    def _conn(self):
+        # sqlite3 connections are per thread; the pool threads each get their own
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, model_id, texts):
+        """{index: vector} for the texts already cached; misses are left out."""
+        keys = [cache_key(model_id, text) for text in texts]
+        found = {}
+        cold = {}
+        for i, key in enumerate(keys):
+            vector = self.hot.get(key)
+            if vector is not None:
+                found[i] = vector
+            else:
+                cold.setdefault(key, []).append(i)
+
+        if cold:
+            conn = self._conn()
+            cold_keys = list(cold)
+            hit_keys = []
+            for start in range(0, len(cold_keys), LOOKUP_BATCH_SIZE):
+                batch = cold_keys[start:start + LOOKUP_BATCH_SIZE]
+                marks = ','.join('?' * len(batch))
+                for key, blob in conn.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({marks})', batch):
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self.hot.set(key, vector)
+                    hit_keys.append(key)
+                    for i in cold[key]:
+                        found[i] = vector
+            if hit_keys:
+                now = time.time()
+                conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                 [(now, key) for key in hit_keys])
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def get(self, model_id, text):
+        return self.get_many(model_id, [text]).get(0)
+
+    def set_many(self, model_id, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = cache_key(model_id, text)
+            self.hot.set(key, list(vector))
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((key, array.size, array.tobytes(), now))
+        if not rows:
+            return
+        conn = self._conn()
+        conn.executemany('INSERT OR REPLACE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)', rows)
+        with self._lock:
+            if self._count is None:
+                self._count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            else:
+                self._count += len(rows)
+            over = self._count > self.max_entries
+        if over:
+            self._evict(conn)
+
+    def set(self, model_id, text, vector):
+        self.set_many(model_id, [text], [vector])
+
+    def _evict(self, conn):
+        target = int(self.max_entries * (1 - EVICT_SLACK))
+        count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        if count > target:
+            conn.execute(
+                'DELETE FROM embeddings WHERE key IN '
+                '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                (count - target,),
+            )
+            logger.info(f"Evicted {count - target} cached embeddings")
+            count = target
+        with self._lock:
+            self._count = count
+
+    def clear(self):
+        self.hot.clear()
+        self._conn().execute('DELETE FROM embeddings')
+        with self._lock:
+            self._count = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+            'entries': self._count,
+            'max_entries': self.max_entries,
+            'hot': self.hot.stats(),
+        }
+
+
+embedding_cache = EmbeddingCache.from_config()
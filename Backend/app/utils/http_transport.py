@@ -0,0 +1,351 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import Config
+from app.utils.metrics import SIZE_BUCKETS, metrics, span
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - async client is optional
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+_deadline = contextvars.ContextVar('transport_deadline', default=None)
+
+
+@contextmanager
+def deadline(at):
+    """
+    Blocking upstream calls made in this context must finish by monotonic time
+    at: each attempt's timeouts shrink to the time left, and no retry or
+    cooldown wait runs past it. Nested deadlines keep the earlier one.
+    """
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds until the current deadline, or None outside one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def _encode(payload):
+    """(JSON body, model_id label). Encoded once, reused by every retry and counted for metrics."""
+    body = json.dumps(payload).encode('utf-8')
+    model = payload.get('model_id', 'unknown') if isinstance(payload, dict) else 'unknown'
+    metrics.observe('upstream_request_bytes', len(body), buckets=SIZE_BUCKETS,
+                    help='Request body size sent to the model endpoint', model=model)
+    return body, model
+
+
+def _count_response(model, size):
+    metrics.observe('upstream_response_bytes', size, buckets=SIZE_BUCKETS,
+                    help='Response body size from the model endpoint', model=model)
+
+
+def _count_retry(model, error):
+    metrics.inc('upstream_retries_total', help='Model endpoint retries',
+                model=model, status=error.status_code or 'connection')
+
+
+class TransportError(RuntimeError):
+    """Request to the model endpoint failed after all retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _retry_after(headers):
+    value = headers.get('Retry-After') if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class HTTPTransport:
+    """
+    Shared transport for the Lambda/Bedrock endpoint: one pooled keep-alive
+    session per process, (connect, read) timeouts, and retries with full
+    jitter backoff on 429/5xx and connection errors. apost_json is the
+    non-blocking equivalent on an httpx.AsyncClient per event loop.
+    """
+
+    def __init__(self, pool_size=20, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        # loop -> (AsyncClient, async generator that closes it when the loop shuts down)
+        self._async_clients = {}
+        # After a 429 every caller holds off until this monotonic time
+        self._throttled_until = 0.0
+
+    @classmethod
+    def from_config(cls, config=Config):
+        return cls(
+            pool_size=config.HTTP_POOL_SIZE,
+            connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=config.HTTP_READ_TIMEOUT,
+            max_retries=config.HTTP_MAX_RETRIES,
+            backoff_base=config.HTTP_BACKOFF_BASE,
+            backoff_max=config.HTTP_BACKOFF_MAX,
+        )
+
+    @property
+    def session(self):
+        # Sockets must not be shared across a fork, so each process builds its own pool
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def throttle(self, attempt, retry_after=None):
+        """Record a rate-limit response so concurrent callers back off together."""
+        delay = self.backoff(attempt, retry_after)
+        with self._lock:
+            self._throttled_until = max(self._throttled_until, time.monotonic() + delay)
+        return delay
+
+    def cooldown(self):
+        """Seconds left before requests may be sent again after a 429."""
+        return max(0.0, self._throttled_until - time.monotonic())
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            connect, read = self.timeout
+        else:
+            connect, read = timeout if isinstance(timeout, tuple) else (self.timeout[0], timeout)
+        left = time_left()
+        if left is not None:
+            if left <= 0:
+                raise TransportError("Deadline passed before the request was sent")
+            connect, read = min(connect, left), min(read, left)
+        return connect, read
+
+    def _retry_delay(self, error, attempt, retry_after):
+        if error.status_code == 429:
+            return self.throttle(attempt, retry_after)
+        return self.backoff(attempt, retry_after)
+
+    def post(self, url, payload, timeout=None, stream=False):
+        """POST JSON with retries. Returns the requests.Response (status < 400)."""
+        body, model = _encode(payload)
+        with span(f'upstream.{model}', request_bytes=len(body), stream=stream) as attrs:
+            response = self._post(url, body, model, timeout, stream, attrs)
+            if not stream:
+                attrs['response_bytes'] = len(response.content)
+                _count_response(model, attrs['response_bytes'])
+            return response
+
+    def _post(self, url, body, model, timeout, stream, attrs):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            attrs['attempts'] = attempt + 1
+            retry_after = None
+            wait = self.cooldown()
+            if wait:
+                left = time_left()
+                if left is not None and wait >= left:
+                    raise last_error or TransportError("Rate limited past the deadline", status_code=429)
+                time.sleep(wait)
+            request_timeout = self._timeout(timeout)
+            try:
+                response = self.session.post(url, headers=JSON_HEADERS, data=body,
+                                             timeout=request_timeout, stream=stream)
+                if response.status_code < 400:
+                    return response
+                last_error = TransportError(
+                    f"API request failed with {response.status_code}: {response.text[:500]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    raise last_error
+                retry_after = _retry_after(response.headers)
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = TransportError(f"API request failed: {e}")
+            if attempt < self.max_retries:
+                delay = self._retry_delay(last_error, attempt, retry_after)
+                left = time_left()
+                if left is not None and delay >= left:
+                    break
+                _count_retry(model, last_error)
+                logger.warning(f"{last_error}; retrying in {delay:.2f}s")
+                time.sleep(delay)
+        raise last_error
+
+    def post_json(self, url, payload, timeout=None):
+        response = self.post(url, payload, timeout=timeout)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise TransportError(f"Invalid JSON from endpoint: {e}") from e
+
+    async def async_client(self):
+        """
+        The httpx.AsyncClient of the running loop. It is closed when the loop
+        shuts down its async generators (asyncio.run does), or by aclose().
+        """
+        if httpx is None:
+            raise RuntimeError("httpx is required for the async model client")
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            connect, read = self.timeout
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+                headers=JSON_HEADERS,
+            )
+            closer = self._close_with_loop(loop, client)
+            # The first step registers the generator with the loop's shutdown_asyncgens
+            await closer.__anext__()
+            entry = (client, closer)
+            with self._lock:
+                self._async_clients[loop] = entry
+        return entry[0]
+
+    async def _close_with_loop(self, loop, client):
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._async_clients.pop(loop, None)
+            await client.aclose()
+
+    async def aclose(self):
+        """Close the running loop's client now, for loops that are closed without asyncio.run."""
+        entry = self._async_clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+    async def apost_json(self, url, payload, timeout=None):
+        """Non-blocking post_json."""
+        body, model = _encode(payload)
+        with span(f'upstream.{model}', request_bytes=len(body), stream=False) as attrs:
+            response = await self._apost(url, body, model, timeout, attrs)
+            attrs['response_bytes'] = len(response.content)
+            _count_response(model, attrs['response_bytes'])
+            try:
+                return response.json()
+            except ValueError as e:
+                raise TransportError(f"Invalid JSON from endpoint: {e}") from e
+
+    async def _apost(self, url, body, model, timeout, attrs):
+        client = await self.async_client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            attrs['attempts'] = attempt + 1
+            retry_after = None
+            wait = self.cooldown()
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await client.post(url, content=body, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                if response.status_code < 400:
+                    return response
+                last_error = TransportError(
+                    f"API request failed with {response.status_code}: {response.text[:500]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    raise last_error
+                retry_after = _retry_after(response.headers)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                last_error = TransportError(f"API request failed: {e}")
+            if attempt < self.max_retries:
+                _count_retry(model, last_error)
+                delay = self._retry_delay(last_error, attempt, retry_after)
+                logger.warning(f"{last_error}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        raise last_error
+
+    @asynccontextmanager
+    async def astream(self, url, payload, timeout=None):
+        """
+        Async POST whose body is read incrementally (aiter_lines/aiter_bytes).
+        Retries only happen before the response starts; the response is closed on exit.
+        """
+        body, model = _encode(payload)
+        # Timed to the response headers, like post(stream=True); the body is the caller's
+        with span(f'upstream.{model}', request_bytes=len(body), stream=True) as attrs:
+            response = await self._asend_stream(url, body, model, timeout, attrs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def _asend_stream(self, url, body, model, timeout, attrs):
+        client = await self.async_client()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            attrs['attempts'] = attempt + 1
+            retry_after = None
+            wait = self.cooldown()
+            if wait:
+                await asyncio.sleep(wait)
+            request = client.build_request('POST', url, content=body,
+                                           timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+            try:
+                response = await client.send(request, stream=True)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                last_error = TransportError(f"API request failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response
+                error_body = (await response.aread()).decode('utf-8', errors='replace')
+                await response.aclose()
+                last_error = TransportError(
+                    f"API request failed with {response.status_code}: {error_body[:500]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    raise last_error
+                retry_after = _retry_after(response.headers)
+            if attempt < self.max_retries:
+                _count_retry(model, last_error)
+                delay = self._retry_delay(last_error, attempt, retry_after)
+                logger.warning(f"{last_error}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        raise last_error
+
+transport = HTTPTransport.from_config()
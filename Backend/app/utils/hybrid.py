@@ -0,0 +1,132 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from llama_index.core import QueryBundle
+
+from app.config import Config
+from app.utils.http_transport import deadline
+from app.utils.langchain_sql import format_answer, query_sql
+from app.utils.llama_index import custom_llm, query_engine, source_list
+from app.utils.metrics import bind, span
+
+logger = logging.getLogger(__name__)
+
+# Characters of each retrieved chunk placed in the synthesis prompt
+EXCERPT_CHARS = 1500
+
+_executor = ThreadPoolExecutor(max_workers=Config.HYBRID_WORKERS, thread_name_prefix='hybrid')
+
+HYBRID_PROMPT = """You answer supply-chain questions using two kinds of evidence:
+company documents and query results from the orders database.
+
+Document excerpts:
+{documents}
+
+Orders data (from: {sql}):
+{table}
+
+Answer the question using both sources where relevant. If one source is
+missing or does not cover part of the question, say so briefly.
+
+Question: {question}
+Answer:"""
+
+
+def _retrieve(query, top_k, until):
+    """
+    Retrieval through the shared query engine (its retriever and the
+    ContextBudget re-rank/trim), keeping the best top_k nodes, since the
+    prompt also has to fit the orders data.
+    """
+    with deadline(until), span('retrieve') as attrs:
+        nodes = query_engine().retrieve(QueryBundle(query))[:top_k]
+        attrs['nodes'] = len(nodes)
+    return nodes
+
+
+def _sql_leg(app, query, until):
+    with app.app_context(), deadline(until):
+        return query_sql(query, deadline=until)
+
+
+def _collect(future, deadline, name, legs):
+    """Result of one leg, or None if it failed or missed its deadline (recorded in legs)."""
+    started = legs[name]['started']
+    try:
+        result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        legs[name].update(ok=True, seconds=round(time.monotonic() - started, 3))
+        return result
+    except FutureTimeoutError:
+        error = 'timed out'
+        # Drops a leg still queued behind a busy pool; a running one stops at its own deadline
+        future.cancel()
+    except Exception as e:
+        error = str(e)
+    logger.warning(f"Hybrid {name} leg failed: {error}")
+    legs[name].update(ok=False, seconds=round(time.monotonic() - started, 3), error=error)
+    return None
+
+
+def _run_legs(query):
+    """
+    Run document retrieval and the SQL leg concurrently, each under its own
+    deadline. The deadline goes down into the legs (model endpoint timeouts
+    and retries, the SQL statement timeout, the wait for a batched
+    embedding), so a leg that misses it also gives its worker thread back.
+    """
+    config = current_app.config
+    app = current_app._get_current_object()
+    now = time.monotonic()
+    doc_deadline, sql_deadline = now + config['HYBRID_DOC_TIMEOUT'], now + config['HYBRID_SQL_TIMEOUT']
+    legs = {'documents': {'started': now}, 'sql': {'started': now}}
+    doc_future = _executor.submit(bind(_retrieve), query, config['HYBRID_TOP_K'], doc_deadline)
+    sql_future = _executor.submit(bind(_sql_leg), app, query, sql_deadline)
+
+    nodes = _collect(doc_future, doc_deadline, 'documents', legs)
+    sql = _collect(sql_future, sql_deadline, 'sql', legs)
+    for leg in legs.values():
+        leg.pop('started')
+    if nodes is None and sql is None:
+        raise RuntimeError(f"Both hybrid legs failed: {legs}")
+    return nodes or [], sql, legs
+
+
+def _prompt(query, nodes, sql):
+    documents = '\n\n'.join(
+        f"[{i}] {node.node.get_text()[:EXCERPT_CHARS]}" for i, node in enumerate(nodes, 1)
+    ) or '(no documents retrieved)'
+    if sql is None:
+        statement, table = 'unavailable', '(orders data unavailable)'
+    else:
+        statement = sql['sql']
+        table = format_answer(sql['columns'], sql['rows'], sql['truncated'])
+    return HYBRID_PROMPT.format(documents=documents, sql=statement, table=table, question=query)
+
+
+def _sql_fields(sql):
+    if sql is None:
+        return {'sql': None, 'columns': [], 'rows': [], 'truncated': False}
+    return {key: sql[key] for key in ('sql', 'columns', 'rows', 'truncated')}
+
+
+def query_hybrid(query):
+    """
+    Answer from documents and orders data together. Both legs run in parallel
+    and feed one synthesis call, so latency is roughly the slower leg plus the
+    LLM, not the sum of all three.
+    """
+    nodes, sql, legs = _run_legs(query)
+    answer = custom_llm.complete(_prompt(query, nodes, sql)).text
+    return {'answer': answer, 'sources': source_list(nodes, query), **_sql_fields(sql), 'legs': legs}
+
+
+def stream_hybrid(query):
+    """Streaming query_hybrid: sources and the SQL result first, then answer tokens."""
+    nodes, sql, legs = _run_legs(query)
+    yield 'sources', source_list(nodes, query)
+    yield 'result', {**_sql_fields(sql), 'legs': legs}
+    for chunk in custom_llm.stream_complete(_prompt(query, nodes, sql)):
+        yield 'token', chunk.delta
+    yield 'done', {'cached': False}
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.extensions import db
+from app.models.user import Job
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def active_key(kind, params):
+    """Identity of a job for de-duplication: its kind and canonical params."""
+    return hashlib.sha1(f"{kind}\n{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+
+
+def _claimable(now):
+    """Queued jobs, and running jobs whose worker stopped renewing the lease."""
+    table = Job.__table__
+    lapsed = table.c.lease_expires_at.is_(None) | (table.c.lease_expires_at < now)
+    return (table.c.status == 'queued') | ((table.c.status == 'running') & lapsed)
+
+
+class JobProgress:
+    """Progress callback handed to job handlers; throttles writes to the jobs table."""
+
+    def __init__(self, job_id, min_interval=1.0):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def __call__(self, rows_processed=None, success_count=None, error_count=None,
+                 rows_total=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+
+        values = {'updated_at': datetime.utcnow()}
+        for key, value in (('rows_processed', rows_processed), ('success_count', success_count),
+                           ('error_count', error_count), ('rows_total', rows_total),
+                           ('message', message)):
+            if value is not None:
+                values[key] = value
+        # Separate connection, so progress never commits the handler's open transaction
+        with db.engine.begin() as conn:
+            conn.execute(Job.__table__.update().where(Job.__table__.c.id == self.job_id).values(**values))
+
+
+class JobRunner:
+    """
+    Local job subsystem: jobs are rows in the jobs table, executed by a thread
+    pool in the process that enqueued them. Handlers are registered per kind
+    and called as handler(progress, **params) inside an app context.
+
+    A running job holds a lease that a heartbeat renews; jobs whose process
+    died are picked up by `flask jobs worker` or `flask jobs resume`, never by
+    app start-up, so preforked web workers and CLI commands do not race for
+    them.
+    """
+
+    def __init__(self, app=None):
+        self.handlers = {}
+        self.app = None
+        self._executor = None
+        # Job ids handed to this process's pool and not finished yet
+        self._submitted = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                            thread_name_prefix='job')
+        app.extensions['job_runner'] = self
+
+    def register(self, kind):
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, kind, **params):
+        """Persist a queued job and hand it to the pool. Returns the Job."""
+        return self._enqueue(kind, params)
+
+    def _enqueue(self, kind, params, key=None):
+        if kind not in self.handlers:
+            raise ValueError(f"No job handler registered for '{kind}'")
+        now = datetime.utcnow()
+        job = Job(kind=kind, status='queued', params=json.dumps(params), created_at=now, updated_at=now,
+                  active_key=key)
+        db.session.add(job)
+        db.session.commit()
+        self._submit(job.id)
+        return job
+
+    def enqueue_once(self, kind, **params):
+        """
+        Like enqueue, but reuse a queued/running job with identical params. The
+        unique active_key makes this hold across processes: a concurrent
+        duplicate fails the insert and gets the winner's job.
+        """
+        job = self.find_active(kind, **params)
+        if job is not None:
+            return job
+        key = active_key(kind, params)
+        try:
+            return self._enqueue(kind, params, key)
+        except IntegrityError:
+            db.session.rollback()
+        job = Job.query.filter_by(active_key=key).first()
+        # The winner may already have finished and released the key
+        return job or self._enqueue(kind, params, key)
+
+    def find_active(self, kind, **params):
+        """Return a queued or running job of this kind with the same params, if any."""
+        return (Job.query
+                .filter(Job.kind == kind, Job.status.in_(ACTIVE_STATUSES),
+                        Job.params == json.dumps(params))
+                .order_by(Job.created_at.desc())
+                .first())
+
+    def resume_pending(self):
+        """
+        Hand this process's pool the jobs no live worker owns: queued jobs, and
+        running jobs whose lease lapsed because their process died. _claim
+        decides who runs each one, so several processes may call this at once.
+        Returns the number of jobs submitted.
+        """
+        with self.app.app_context():
+            try:
+                jobs = Job.query.filter(_claimable(datetime.utcnow())).all()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.warning(f"Could not resume pending jobs: {getattr(e, 'orig', e)}")
+                return 0
+            submitted = 0
+            for job in jobs:
+                if self._submit(job.id):
+                    logger.info(f"Resuming job {job.id} ({job.kind}, {job.status})")
+                    submitted += 1
+            db.session.remove()
+        return submitted
+
+    def shutdown(self, wait=True):
+        """Stop taking jobs; with wait, block until the ones in the pool finish."""
+        self._executor.shutdown(wait=wait)
+
+    def _submit(self, job_id):
+        with self._lock:
+            if job_id in self._submitted:
+                return False
+            self._submitted.add(job_id)
+        self._executor.submit(self._run, job_id)
+        return True
+
+    def _claim(self, job_id):
+        """
+        Atomically take a queued job, or a running one whose lease lapsed, and
+        start a fresh lease, so only one worker runs it.
+        """
+        now = datetime.utcnow()
+        table = Job.__table__
+        result = db.session.execute(
+            table.update()
+            .where((table.c.id == job_id) & _claimable(now))
+            .values(status='running', started_at=now, updated_at=now, finished_at=None,
+                    lease_expires_at=now + timedelta(seconds=self.app.config['JOB_LEASE_SECONDS']))
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @contextmanager
+    def _lease(self, job_id):
+        """Renew the job's lease every third of JOB_LEASE_SECONDS while the handler runs."""
+        app, stop = self.app, threading.Event()
+        seconds = app.config['JOB_LEASE_SECONDS']
+        table = Job.__table__
+
+        def heartbeat():
+            with app.app_context():
+                while not stop.wait(seconds / 3):
+                    try:
+                        # Separate connection, like JobProgress
+                        with db.engine.begin() as conn:
+                            conn.execute(
+                                table.update()
+                                .where((table.c.id == job_id) & (table.c.status == 'running'))
+                                .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=seconds))
+                            )
+                    except SQLAlchemyError as e:
+                        logger.warning(f"Could not renew the lease of job {job_id}: {getattr(e, 'orig', e)}")
+
+        thread = threading.Thread(target=heartbeat, name='job-lease', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _finish(self, job_id, status, result=None, message=None):
+        job = db.session.get(Job, job_id)
+        job.status = status
+        if result is not None:
+            job.result = json.dumps(result, default=str)
+        if message is not None:
+            job.message = message
+        job.finished_at = job.updated_at = datetime.utcnow()
+        job.lease_expires_at = job.active_key = None
+        db.session.commit()
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+                job = db.session.get(Job, job_id)
+                handler = self.handlers[job.kind]
+                params = json.loads(job.params or '{}')
+                with self._lease(job_id):
+                    result = handler(JobProgress(job_id), **params)
+                self._finish(job_id, 'succeeded', result=result)
+            except Exception as e:
+                logger.exception(f"Job {job_id} failed")
+                db.session.rollback()
+                self._finish(job_id, 'failed', message=str(e))
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._submitted.discard(job_id)
+
+
+job_runner = JobRunner()
@@ -1,2 +1,323 @@
-def query_sql(query):
-    return {'response': 'Dummy SQL result for: ' + query}
+import logging
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+from langchain.prompts import PromptTemplate
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models.user import Order, OrderRollup
+from app.utils.csv_ingest import data_version
+from app.utils.lru_cache import LRUCache
+from app.utils.metrics import span
+from app.utils.rollups import rollup_sql
+from app.utils.query_classifier import CustomBedrockLLM, llm, normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+class UnsafeSQLError(ValueError):
+    """Generated SQL was rejected by the read-only validator."""
+
+
+# Tables the generated SQL may read; user/role tables are deliberately absent
+ALLOWED_TABLES = {'orders', 'order_rollups'}
+
+FORBIDDEN_KEYWORDS = re.compile(
+    r'\b(insert|update|delete|drop|alter|create|replace|truncate|merge|attach|detach|'
+    r'pragma|vacuum|reindex|grant|revoke|call|exec|execute|copy|load_extension)\b',
+    re.IGNORECASE,
+)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+IDENTIFIER = r'(?:"[^"]*"|`[^`]*`|\[[^\]]*\]|[A-Za-z_]\w*)'
+TABLE_NAME = re.compile(rf'{IDENTIFIER}(?:\s*\.\s*{IDENTIFIER})*')
+ALIAS = re.compile(rf'\s*(?:as\s+)?({IDENTIFIER})', re.IGNORECASE)
+FROM_OR_JOIN = re.compile(r'\b(?:from|join)\b', re.IGNORECASE)
+# FROM inside these calls is an argument separator, not a table list
+FROM_FUNCTION = re.compile(r'\b(?:extract|substring|trim|overlay|position)\s*$', re.IGNORECASE)
+# Words that may follow a table reference without being its alias
+CLAUSE_KEYWORDS = {'where', 'group', 'order', 'having', 'limit', 'offset', 'join', 'inner', 'left', 'right',
+                   'full', 'cross', 'outer', 'natural', 'on', 'using', 'union', 'intersect', 'except', 'window'}
+CTE_NAME = re.compile(r'(?:\bwith(?:\s+recursive)?|,)\s*([A-Za-z_]\w*)\s*(?:\([^)]*\))?\s+as\s*\(',
+                      re.IGNORECASE)
+CODE_FENCE = re.compile(r'^```(?:sql)?\s*|\s*```$', re.IGNORECASE)
+
+# SQL generation needs a deterministic, longer completion than the classifier
+sql_llm = CustomBedrockLLM(
+    url=llm.url,
+    api_key=llm.api_key,
+    model_id="claude-3.5-sonnet",
+    temperature=0.0,
+    max_tokens=400
+)
+
+sql_prompt = PromptTemplate.from_template("""
+You write {dialect} SQL for a supply-chain analytics database.
+
+Schema:
+{schema}
+
+Rules:
+- Write exactly ONE read-only SELECT statement (a WITH clause is allowed).
+- Only use the tables and columns listed above.
+- order_rollups is a pre-aggregated monthly cube of orders (sums and counts per
+  year, month, market, order_region, category_name, shipping_mode). Prefer it
+  whenever the question only needs those dimensions; averages are
+  SUM(x_sum) / SUM(order_count).
+- Aggregate where the question asks for totals, averages or rankings.
+- Respond ONLY with the SQL, no explanation and no code fences.
+
+Question: {question}
+""")
+
+sql_chain = sql_prompt | sql_llm
+
+_sql_cache = None
+_result_cache = None
+
+
+def _caches():
+    global _sql_cache, _result_cache
+    if _sql_cache is None:
+        _sql_cache = LRUCache(maxsize=current_app.config['SQL_CACHE_SIZE'])
+        _result_cache = LRUCache(maxsize=current_app.config['SQL_CACHE_SIZE'])
+    return _sql_cache, _result_cache
+
+
+def describe_schema():
+    """Compact table(column TYPE, ...) description built from the models."""
+    lines = []
+    for table in (Order.__table__, OrderRollup.__table__):
+        columns = ', '.join(f"{c.name} {c.type.compile(dialect=db.engine.dialect)}" for c in table.columns)
+        lines.append(f"{table.name}({columns})")
+    return '\n'.join(lines)
+
+
+def _unquote(identifier):
+    if identifier[:1] in '"`[':
+        return identifier[1:-1]
+    return identifier
+
+
+def _skip_parens(sql, pos):
+    """Position just after the parenthesis group opening at pos."""
+    depth = 0
+    for i in range(pos, len(sql)):
+        if sql[i] == '(':
+            depth += 1
+        elif sql[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    raise UnsafeSQLError("Unbalanced parentheses")
+
+
+def _in_from_function(sql, pos):
+    """Whether the FROM at pos is inside EXTRACT(... FROM ...) or a similar call."""
+    depth = 0
+    for i in range(pos - 1, -1, -1):
+        if sql[i] == ')':
+            depth += 1
+        elif sql[i] == '(':
+            if depth == 0:
+                return bool(FROM_FUNCTION.search(sql[:i]))
+            depth -= 1
+    return False
+
+
+def table_references(sql):
+    """
+    Every table named in a FROM or JOIN clause of sql (string literals already
+    scrubbed): each item of comma-separated lists, quoted and schema-qualified
+    names included. Subqueries are skipped here and picked up by their own FROM.
+    """
+    for match in FROM_OR_JOIN.finditer(sql):
+        if match.group(0).lower() == 'from' and _in_from_function(sql, match.start()):
+            continue
+        pos = match.end()
+        while True:
+            while pos < len(sql) and sql[pos].isspace():
+                pos += 1
+            if sql.startswith('(', pos):
+                pos = _skip_parens(sql, pos)
+            else:
+                table = TABLE_NAME.match(sql, pos)
+                if table is None:
+                    raise UnsafeSQLError(f"Unrecognized table reference: {sql[pos:pos + 30]}")
+                yield table.group(0)
+                pos = table.end()
+            alias = ALIAS.match(sql, pos)
+            if alias and _unquote(alias.group(1)).lower() not in CLAUSE_KEYWORDS:
+                pos = alias.end()
+            while pos < len(sql) and sql[pos].isspace():
+                pos += 1
+            if not sql.startswith(',', pos):
+                break
+            pos += 1
+
+
+def validate_sql(sql):
+    """Return the cleaned statement if it is a single read-only query, else raise UnsafeSQLError."""
+    sql = CODE_FENCE.sub('', sql.strip()).strip().rstrip(';').strip()
+    scrubbed = STRING_LITERAL.sub("''", sql)
+
+    if not re.match(r'^(select|with)\b', scrubbed, re.IGNORECASE):
+        raise UnsafeSQLError("Only SELECT queries are allowed")
+    if ';' in scrubbed:
+        raise UnsafeSQLError("Multiple statements are not allowed")
+    if '--' in scrubbed or '/*' in scrubbed:
+        raise UnsafeSQLError("SQL comments are not allowed")
+    keyword = FORBIDDEN_KEYWORDS.search(scrubbed)
+    if keyword:
+        raise UnsafeSQLError(f"Forbidden keyword: {keyword.group(1).upper()}")
+
+    ctes = {name.lower() for name in CTE_NAME.findall(scrubbed)}
+    for table in table_references(scrubbed):
+        name = _unquote(re.split(r'\s*\.\s*', table)[-1]).lower()
+        if name not in ALLOWED_TABLES and name not in ctes:
+            raise UnsafeSQLError(f"Table not allowed: {table}")
+    return sql
+
+
+def generate_sql(question):
+    """Text-to-SQL through the Bedrock LLM, cached by normalized question."""
+    sql_cache, _ = _caches()
+    key = normalize_question(question)
+    sql = sql_cache.get(key)
+    if sql is None:
+        with span('sql.generate'):
+            raw = sql_chain.invoke({
+                'dialect': db.engine.dialect.name,
+                'schema': describe_schema(),
+                'question': question,
+            })
+        sql = validate_sql(raw)
+        sql_cache.set(key, sql)
+    return sql
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+SQLITE_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE,
+                          sqlite3.SQLITE_TRANSACTION}
+
+
+def _sqlite_authorizer(action, table, column, database, trigger):
+    """Deny reads outside ALLOWED_TABLES (auth tables, sqlite_master) and anything but SELECT."""
+    if action == sqlite3.SQLITE_READ:
+        return sqlite3.SQLITE_OK if table and table.lower() in ALLOWED_TABLES else sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK if action in SQLITE_ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def _apply_limits(conn, timeout):
+    """Per-connection read-only mode and statement timeout. Returns a cleanup callable."""
+    dialect = conn.engine.dialect.name
+    if dialect == 'sqlite':
+        raw = conn.connection.driver_connection
+        deadline = time.monotonic() + timeout
+        raw.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        conn.exec_driver_sql('PRAGMA query_only = ON')
+        # Enforced by SQLite on the compiled statement, whatever the SQL text looks like
+        raw.set_authorizer(_sqlite_authorizer)
+
+        def cleanup():
+            raw.set_authorizer(None)
+            conn.exec_driver_sql('PRAGMA query_only = OFF')
+            raw.set_progress_handler(None, 0)
+        return cleanup
+    if dialect == 'postgresql':
+        conn.exec_driver_sql('SET TRANSACTION READ ONLY')
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout * 1000)}')
+    elif dialect == 'mysql':
+        # Next transaction only; the session timeout is put back before the
+        # connection returns to the pool
+        conn.exec_driver_sql('SET TRANSACTION READ ONLY')
+        conn.exec_driver_sql('SET @previous_max_execution_time = @@SESSION.MAX_EXECUTION_TIME')
+        conn.exec_driver_sql(f'SET SESSION MAX_EXECUTION_TIME = {int(timeout * 1000)}')
+
+        def cleanup():
+            conn.exec_driver_sql('SET SESSION MAX_EXECUTION_TIME = @previous_max_execution_time')
+        return cleanup
+    return lambda: None
+
+
+def run_sql(sql, max_rows=None, timeout=None):
+    """
+    Execute a validated SELECT with a row limit and statement timeout.
+    Returns: dict with columns, rows, truncated
+    """
+    max_rows = max_rows or current_app.config['SQL_MAX_ROWS']
+    timeout = timeout or current_app.config['SQL_TIMEOUT_SECONDS']
+    sql = validate_sql(sql)
+    limited = f"SELECT * FROM ({sql}) AS limited_query LIMIT {int(max_rows) + 1}"
+
+    with span('sql.execute') as attrs, db.engine.connect() as conn:
+        cleanup = _apply_limits(conn, timeout)
+        try:
+            result = conn.execute(text(limited))
+            columns = list(result.keys())
+            rows = [[_json_value(v) for v in row] for row in result.fetchmany(max_rows + 1)]
+            attrs['rows'] = len(rows)
+        finally:
+            conn.rollback()
+            cleanup()
+
+    return {'columns': columns, 'rows': rows[:max_rows], 'truncated': len(rows) > max_rows}
+
+
+def format_answer(columns, rows, truncated=False, max_lines=20):
+    """Readable answer for the UI without another LLM round-trip."""
+    if not rows:
+        return "No matching rows."
+    if len(rows) == 1 and len(columns) == 1:
+        return f"{columns[0]}: {rows[0][0]}"
+    lines = ['| ' + ' | '.join(columns) + ' |', '|' + '---|' * len(columns)]
+    for row in rows[:max_lines]:
+        lines.append('| ' + ' | '.join('' if v is None else str(v) for v in row) + ' |')
+    if truncated or len(rows) > max_lines:
+        lines.append(f"(showing {min(len(rows), max_lines)} rows)")
+    return '\n'.join(lines)
+
+
+def query_sql(query, deadline=None):
+    """
+    Answer a structured question from the orders data.
+    Generated SQL is cached per normalized question; results per SQL text and
+    data version, so repeated questions skip both the LLM and the database.
+    With a deadline (monotonic time) the statement timeout is cut to the time left.
+    """
+    _, result_cache = _caches()
+    # Simple measure-by-dimension questions are answered from the cube without the LLM
+    sql = rollup_sql(query) or generate_sql(query)
+    key = (sql, data_version())
+    result = result_cache.get(key)
+    cached = result is not None
+    if not cached:
+        timeout = None
+        if deadline is not None:
+            timeout = min(current_app.config['SQL_TIMEOUT_SECONDS'], deadline - time.monotonic())
+            if timeout <= 0:
+                raise TimeoutError("Deadline passed before the SQL query ran")
+        result = run_sql(sql, timeout=timeout)
+        result_cache.set(key, result)
+    else:
+        logger.info(f"SQL result cache hit for: {sql}")
+
+    return {
+        'answer': format_answer(result['columns'], result['rows'], result['truncated']),
+        'sql': sql,
+        'columns': result['columns'],
+        'rows': result['rows'],
+        'truncated': result['truncated'],
+        'cached': cached,
+    }
@@ -1,66 +1,250 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+
 from llama_index.core.embeddings import BaseEmbedding
 # from typing import List
-import requests
-import json
-import asyncio
 from pydantic import Field # Import Field from pydantic
 
 
 from llama_index.core.llms.llm import LLM  # Import the specific LLM type
 from llama_index.core.llms import CompletionResponse, LLMMetadata, ChatResponse
-from llama_index.core.base.llms.types import ChatMessage, MessageRole, CompletionResponseGen, ChatResponseGen
+from llama_index.core.base.llms.types import (
+    ChatMessage, MessageRole, CompletionResponseGen, ChatResponseGen,
+    CompletionResponseAsyncGen, ChatResponseAsyncGen,
+)
 from typing import Any, Dict, Sequence, List, Optional, Iterator
 from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import QueryBundle
 
-from llama_index.core import StorageContext, load_index_from_storage
 from app.config import Config
+from app.utils.context_budget import ContextBudget, snippet, vector_lookup, words
+from app.utils.embedding_cache import embedding_cache
+from app.utils.http_transport import RETRY_STATUSES, time_left, transport
+from app.utils.metrics import SIZE_BUCKETS, metrics, span
+from app.utils.micro_batch import MicroBatcher
+from app.utils.semantic_cache import answer_cache
+from app.utils.vector_index import IndexManager, store_version
 
 BEDROCK_API_KEY = Config.BEDROCK_API_KEY
 
+logger = logging.getLogger(__name__)
+
+
+def _retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    return status is None or status in RETRY_STATUSES
+
 
 class CustomAmazonEmbedding(BaseEmbedding):
     # Define api_key and url as Pydantic fields
     api_key: str = Field(..., description="API key for the embedding service")
     url: str = Field(..., description="Endpoint URL for the embedding service")
-
-    def __init__(self, api_key: str, url: str):
+    max_concurrency: int = Field(default=8, description="Embedding requests in flight at once")
+    retry_rounds: int = Field(default=2, description="Extra passes over texts that failed in a batch")
+    # One semaphore per event loop, shared by concurrent batch calls
+    _semaphores: Any = PrivateAttr(default_factory=weakref.WeakKeyDictionary)
+    _cache: Any = PrivateAttr(default=None)
+    # Coalesces query embeddings from concurrent requests; None when disabled
+    _batcher: Any = PrivateAttr(default=None)
+
+    def __init__(self, api_key: str, url: str, embed_batch_size: int = None,
+                 max_concurrency: int = None, retry_rounds: int = None, cache: Any = embedding_cache,
+                 micro_batch: bool = None):
         # Pydantic handles the assignment of api_key and url
         # Initialize parent class with required parameters
         super().__init__(
             api_key=api_key, # Pass api_key to the parent constructor if needed by BaseEmbedding
             url=url, # Pass url to the parent constructor if needed by BaseEmbedding
             model_name="amazon-embedding-v2",
-            embed_batch_size=10  # Default batch size for embeddings
+            embed_batch_size=embed_batch_size or Config.EMBED_BATCH_SIZE,
+            max_concurrency=max_concurrency or Config.EMBED_CONCURRENCY,
+            retry_rounds=Config.EMBED_RETRY_ROUNDS if retry_rounds is None else retry_rounds,
         )
+        self._cache = cache
+        if Config.MICROBATCH_ENABLED if micro_batch is None else micro_batch:
+            self._batcher = MicroBatcher.from_config(self._embed_outcomes, name="embed-batch")
 
-    def _get_text_embedding(self, text: str) -> List[float]:
-        payload = {
+    def _payload(self, text: str) -> Dict[str, Any]:
+        return {
             "api_key": self.api_key,
             "prompt": text,
             "model_id": "amazon-embedding-v2"
         }
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(self.url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
+
+    def _request_embedding(self, text: str) -> List[float]:
+        result = transport.post_json(self.url, self._payload(text))
         return result["response"]["embedding"]
 
+    async def _arequest_embedding(self, text: str) -> List[float]:
+        result = await transport.apost_json(self.url, self._payload(text))
+        return result["response"]["embedding"]
+
+    def _split_cached(self, texts: List[str]):
+        """(results with cached vectors filled in, indexes still to embed)."""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if self._cache is None:
+            return results, list(range(len(texts)))
+        for i, vector in self._cache.get_many(self.model_name, texts).items():
+            results[i] = vector
+        return results, [i for i, vector in enumerate(results) if vector is None]
+
+    def _store(self, texts: List[str], vectors: List[List[float]]) -> None:
+        if self._cache is not None and texts:
+            self._cache.set_many(self.model_name, texts, vectors)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
     def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
-        # Implement the required method for batch processing
-        return [self._get_text_embedding(text) for text in texts]
+        """Cached vectors where available, the rest from the endpoint."""
+        results, missing = self._split_cached(texts)
+        if missing:
+            vectors = self._embed_batch([texts[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
+            self._store([texts[i] for i in missing], vectors)
+        return results
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        results, missing = self._split_cached(texts)
+        if missing:
+            vectors = await self._aembed_batch([texts[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
+            self._store([texts[i] for i in missing], vectors)
+        return results
+
+    def _embed_batch(self, texts: List[str], raise_errors: bool = True) -> List[Any]:
+        """
+        Embed a batch with up to max_concurrency requests in flight. Results keep
+        the input order; texts that still fail after the transport's own retries
+        get retry_rounds more passes before the first error is raised (or, with
+        raise_errors=False, returned in place of their vectors).
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        for round_ in range(self.retry_rounds + 1):
+            errors = {}
+            workers = min(self.max_concurrency, len(pending))
+            if workers <= 1:
+                for i in pending:
+                    try:
+                        results[i] = self._request_embedding(texts[i])
+                    except RuntimeError as e:
+                        errors[i] = e
+            else:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                    futures = {pool.submit(self._request_embedding, texts[i]): i for i in pending}
+                    for future in as_completed(futures):
+                        try:
+                            results[futures[future]] = future.result()
+                        except RuntimeError as e:
+                            errors[futures[future]] = e
+            if not errors:
+                return results
+            pending = sorted(errors)
+            if round_ == self.retry_rounds or not all(map(_retryable, errors.values())):
+                break
+            logger.warning(f"{len(pending)} of {len(texts)} embeddings failed, retrying")
+            time.sleep(transport.cooldown() or transport.backoff(round_ + 1))
+        if raise_errors:
+            raise errors[pending[0]]
+        for i in pending:
+            results[i] = errors[i]
+        return results
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Async _embed_batch, bounded by a semaphore instead of a thread pool."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(text):
+            async with semaphore:
+                return await self._arequest_embedding(text)
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        for round_ in range(self.retry_rounds + 1):
+            outcomes = await asyncio.gather(*(embed(texts[i]) for i in pending), return_exceptions=True)
+            errors = {}
+            for i, outcome in zip(pending, outcomes):
+                if isinstance(outcome, RuntimeError):
+                    errors[i] = outcome
+                elif isinstance(outcome, BaseException):
+                    raise outcome
+                else:
+                    results[i] = outcome
+            if not errors:
+                return results
+            pending = sorted(errors)
+            if round_ == self.retry_rounds or not all(map(_retryable, errors.values())):
+                break
+            logger.warning(f"{len(pending)} of {len(texts)} embeddings failed, retrying")
+            await asyncio.sleep(transport.cooldown() or transport.backoff(round_ + 1))
+        raise errors[pending[0]]
+
+    def _embed_outcomes(self, texts: List[str]) -> List[Any]:
+        """Micro-batch handler: the endpoint embeds one text per call, so a batch fans out through _embed_batch."""
+        return self._embed_batch(texts, raise_errors=False)
 
     def _get_query_embedding(self, query: str) -> List[float]:
         # Implement the required method for query embeddings
-        return self._get_text_embedding(query)
+        with span("embed", chars=len(query)) as attrs:
+            if self._batcher is None:
+                return self._get_text_embedding(query)
+            results, missing = self._split_cached([query])
+            attrs["cached"] = not missing
+            if not missing:
+                return results[0]
+            # Under a deadline only the wait is bounded; the batch itself serves other callers too
+            vector = self._batcher(query, timeout=time_left())
+            self._store([query], [vector])
+            return vector
 
     async def _aget_query_embedding(self, query: str) -> List[float]:
-        # Implement the async version
-        # For this example, we'll just call the sync method.
-        # In a real async implementation, you would use an async http client.
-        return self._get_query_embedding(query)
-
-
-
+        return await self._aget_text_embedding(query)
+
+
+def _is_whole_json(content_type: str) -> bool:
+    return "json" in content_type and "ndjson" not in content_type and "jsonl" not in content_type
+
+
+def _stream_delta(line: str) -> str:
+    """Text carried by one streamed line (SSE "data:" or JSON lines); raw text passes through."""
+    if line.startswith("data:"):
+        line = line[5:].strip()
+    elif line.startswith(("event:", "id:", "retry:", ":")):
+        return ""
+    if not line or line == "[DONE]":
+        return ""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(event, str):
+        return event
+    if not isinstance(event, dict):
+        return ""
+    delta = event.get("delta")
+    if isinstance(delta, dict):
+        return delta.get("text") or ""
+    for key in ("text", "completion", "outputText", "token"):
+        if isinstance(event.get(key), str):
+            return event[key]
+    content = event.get("response", {}).get("content") if isinstance(event.get("response"), dict) else None
+    if content:
+        return content[0].get("text", "")
+    return ""
 
 
 # Change the base class from BaseLLM to LLM
@@ -99,59 +283,131 @@ class CustomBedrockLikeLLM(LLM):
         }
 
     def _send_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Helper to send the POST request."""
-        headers = {"Content-Type": "application/json"}
-        try:
-            response = requests.post(self._url, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"API request failed: {e}") from e
+        """Helper to send the POST request over the shared pooled transport."""
+        return transport.post_json(self._url, payload)
+
+    async def _asend_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Non-blocking _send_request."""
+        return await transport.apost_json(self._url, payload)
+
+    @staticmethod
+    def _completion_text(result: Dict[str, Any]) -> str:
+        return result.get("response", {}).get("content", [{}])[0].get("text", "")
+
+    def _record_usage(self, attrs: Dict[str, Any], result: Dict[str, Any], text: str) -> None:
+        """Completion size on the current span, plus token histograms when the endpoint reports usage."""
+        attrs["completion_chars"] = len(text)
+        usage = result.get("usage") or result.get("response", {}).get("usage") or {}
+        for kind, key in (("prompt", "input_tokens"), ("completion", "output_tokens")):
+            if isinstance(usage.get(key), int):
+                attrs[f"{kind}_tokens"] = usage[key]
+                metrics.observe("llm_tokens", usage[key], buckets=SIZE_BUCKETS,
+                                help="Tokens per LLM call, as reported by the endpoint",
+                                model=self._model_id, kind=kind)
+
+    @staticmethod
+    def _chat_prompt(messages: Sequence[ChatMessage]) -> str:
+        prompt = "\n".join([f"{m.role}: {m.content}" for m in messages])
+        if messages[-1].role != MessageRole.ASSISTANT:
+             prompt += "\n" + str(MessageRole.ASSISTANT) + ":"
+        return prompt
 
     def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         """Get a completion from the custom LLM."""
         payload = self._get_payload(prompt, **kwargs)
-        result = self._send_request(payload)
-        generated_text = result.get("response", {}).get("content", [{}])[0].get("text", "")
-        return CompletionResponse(text=generated_text)
+        with span("llm.complete", model=self._model_id, prompt_chars=len(prompt)) as attrs:
+            result = self._send_request(payload)
+            text = self._completion_text(result)
+            self._record_usage(attrs, result, text)
+        return CompletionResponse(text=text)
 
     async def acomplete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         """Asynchronously get a completion."""
-        return await asyncio.to_thread(self.complete, prompt, **kwargs)
+        payload = self._get_payload(prompt, **kwargs)
+        with span("llm.complete", model=self._model_id, prompt_chars=len(prompt)) as attrs:
+            result = await self._asend_request(payload)
+            text = self._completion_text(result)
+            self._record_usage(attrs, result, text)
+        return CompletionResponse(text=text)
 
     def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
         """Chat with the custom LLM."""
-        prompt = "\n".join([f"{m.role}: {m.content}" for m in messages])
-        if messages[-1].role != MessageRole.ASSISTANT:
-             prompt += "\n" + str(MessageRole.ASSISTANT) + ":"
-
-        completion_response = self.complete(prompt, **kwargs)
+        completion_response = self.complete(self._chat_prompt(messages), **kwargs)
         assistant_message = ChatMessage(role=MessageRole.ASSISTANT, content=completion_response.text)
         return ChatResponse(message=assistant_message)
 
     async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
         """Asynchronously chat."""
-        return await asyncio.to_thread(self.chat, messages, **kwargs)
+        completion_response = await self.acomplete(self._chat_prompt(messages), **kwargs)
+        assistant_message = ChatMessage(role=MessageRole.ASSISTANT, content=completion_response.text)
+        return ChatResponse(message=assistant_message)
 
-    def stream_complete(self, prompt: str, **kwargs: Any) -> CompletionResponseGen:
-        """Stream completion from the custom LLM."""
-        completion_response = self.complete(prompt, **kwargs)
-        yield completion_response
+    def _stream_payload(self, prompt: str, **kwargs: Any) -> Dict[str, Any]:
+        payload = self._get_payload(prompt, **kwargs)
+        if Config.MODEL_STREAMING:
+            payload["stream"] = True
+        return payload
 
-    async def astream_complete(self, prompt: str, **kwargs: Any) -> CompletionResponseGen:
+    def stream_complete(self, prompt: str, **kwargs: Any) -> CompletionResponseGen:
+        """Stream completion from the custom LLM, one delta per chunk the endpoint sends."""
+        started = time.perf_counter()
+        with span("llm.stream", model=self._model_id, prompt_chars=len(prompt)) as attrs:
+            response = transport.post(self._url, self._stream_payload(prompt, **kwargs), stream=True)
+            with closing(response):
+                if _is_whole_json(response.headers.get("Content-Type", "")):
+                    # Endpoint answered without streaming
+                    result = response.json()
+                    text = self._completion_text(result)
+                    self._record_usage(attrs, result, text)
+                    yield CompletionResponse(text=text, delta=text)
+                    return
+                response.encoding = response.encoding or "utf-8"
+                text = ""
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    delta = _stream_delta(line)
+                    if delta:
+                        if not text:
+                            attrs["first_token_seconds"] = round(time.perf_counter() - started, 6)
+                        text += delta
+                        yield CompletionResponse(text=text, delta=delta)
+                attrs["completion_chars"] = len(text)
+
+    async def astream_complete(self, prompt: str, **kwargs: Any) -> CompletionResponseAsyncGen:
         """Asynchronously stream completion."""
-        completion_response = await self.acomplete(prompt, **kwargs)
-        yield completion_response
+        payload = self._stream_payload(prompt, **kwargs)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            async with transport.astream(self._url, payload) as response:
+                if _is_whole_json(response.headers.get("Content-Type", "")):
+                    await response.aread()
+                    text = self._completion_text(response.json())
+                    yield CompletionResponse(text=text, delta=text)
+                    return
+                text = ""
+                async for line in response.aiter_lines():
+                    delta = _stream_delta(line)
+                    if delta:
+                        text += delta
+                        yield CompletionResponse(text=text, delta=delta)
+
+        return gen()
 
     def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
         """Stream chat from the custom LLM."""
-        chat_response = self.chat(messages, **kwargs)
-        yield chat_response
+        for chunk in self.stream_complete(self._chat_prompt(messages), **kwargs):
+            yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=chunk.text),
+                               delta=chunk.delta)
 
-    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
         """Asynchronously stream chat."""
-        chat_response = await self.achat(messages, **kwargs)
-        yield chat_response
+        completions = await self.astream_complete(self._chat_prompt(messages), **kwargs)
+
+        async def gen() -> ChatResponseAsyncGen:
+            async for chunk in completions:
+                yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=chunk.text),
+                                   delta=chunk.delta)
+
+        return gen()
 
     def _as_query_component(self) -> Any:
         """Return itself as a query component."""
@@ -159,7 +415,6 @@ class CustomBedrockLikeLLM(LLM):
 
 
 
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
 from llama_index.core import Settings
 # Import the corrected CustomBedrockLikeLLM which inherits from LLM
 # from __main__ import CustomBedrockLikeLLM # Assuming the class is defined in the main notebook context
@@ -169,7 +424,7 @@ from llama_index.core import Settings
 # Instantiate your custom embedding model
 embedding_model = CustomAmazonEmbedding(
     api_key=BEDROCK_API_KEY,
-    url="https://quchnti6xu7yzw7hfzt5yjqtvi0kafsq.lambda-url.eu-central-1.on.aws/"
+    url=Config.MODEL_ENDPOINT_URL
 )
 
 # Configure settings using the new Settings class for embedding
@@ -178,15 +433,10 @@ Settings.embed_model = embedding_model
 # Instantiate your custom LLM using the updated class
 custom_llm = CustomBedrockLikeLLM(
     api_key=BEDROCK_API_KEY,
-    url="https://quchnti6xu7yzw7hfzt5yjqtvi0kafsq.lambda-url.eu-central-1.on.aws/",
+    url=Config.MODEL_ENDPOINT_URL,
     model_id="claude-3-haiku"
 )
 
-# --- Diagnostic Print ---
-# This check should now pass
-from llama_index.core.llms.llm import LLM
-print(f"Is custom_llm an instance of LLM? {isinstance(custom_llm, LLM)}")
-
 # Configure Settings to use your custom LLM
 Settings.llm = custom_llm
 
@@ -194,27 +444,129 @@ Settings.llm = custom_llm
 
 
 
-storage_context = StorageContext.from_defaults(persist_dir="/home/syngentai/mysite/app/vector_store")
+# Loaded on first use or by the warm-up configured in create_app, not at import
+index_manager = IndexManager(Config.VECTORDIR)
 
-index_loaded2 = load_index_from_storage(storage_context)
 
+def vector_store_version():
+    return store_version(index_manager.persist_dir)
 
 
+def _build_query_engine(index, streaming):
+    postprocessor = ContextBudget.from_config(lookup=vector_lookup(index.vector_store))
+    return index.as_query_engine(similarity_top_k=Config.CONTEXT_RETRIEVE_K,
+                                 node_postprocessors=[postprocessor], streaming=streaming)
 
-def query_documents(query):
-    query_engine = index_loaded2.as_query_engine()
-    response = query_engine.query(query)
 
-    return {
-        "answer": str(response),
-        "sources": [
-            {
-                "text": node.node.get_text(),
-                "metadata": node.node.metadata
-            } for node in response.source_nodes
-        ]
-    }
+def query_engine(streaming=False):
+    """
+    Shared query engine for the loaded index: over-retrieves CONTEXT_RETRIEVE_K
+    chunks, then re-ranks, de-duplicates and trims them to CONTEXT_TOKEN_BUDGET.
+    Rebuilt only when the index is reloaded.
+    """
+    return index_manager.derived(("query_engine", streaming),
+                                 lambda index: _build_query_engine(index, streaming))
+
+
+def source_list(source_nodes, query=""):
+    """
+    Compact sources for a response: a query-centred excerpt of each node and
+    the SOURCE_METADATA_KEYS of its metadata. The full text is served by
+    /api/sources/<id>.
+    """
+    terms = words(query)
+    sources = []
+    for node in source_nodes:
+        text, truncated = snippet(node.node.get_content(), terms, Config.SOURCE_SNIPPET_CHARS)
+        metadata = node.node.metadata
+        sources.append({
+            "id": node.node.node_id,
+            "text": text,
+            "truncated": truncated,
+            "score": round(node.score, 4) if node.score is not None else None,
+            "metadata": {key: metadata[key] for key in Config.SOURCE_METADATA_KEYS if key in metadata},
+        })
+    return sources
+
 
+def get_source(node_id):
+    """Full text and metadata of a retrieved node, or None when it is no longer in the index."""
+    node = index_manager.get().docstore.get_node(node_id, raise_error=False)
+    if node is None:
+        return None
+    return {"id": node.node_id, "text": node.get_content(), "metadata": node.metadata}
 
 
+def remember_answer(vector, version, result):
+    if vector is not None:
+        answer_cache.store(vector, {"answer": result["answer"], "sources": result["sources"]}, version)
 
+
+def cached_answer(query):
+    """(cached result or None, query vector, store version) for the semantic answer cache."""
+    version = vector_store_version()
+    if answer_cache is None:
+        return None, None, version
+    vector = embedding_model.get_query_embedding(query)
+    hit = answer_cache.lookup(vector, version)
+    if hit is None:
+        return None, vector, version
+    result, similarity = hit
+    logger.info(f"Semantic answer cache hit ({similarity:.3f}) for: {query}")
+    return {**result, "cached": True}, vector, version
+
+
+def query_documents(query):
+    """
+    Answer from the document index. Answers are cached by query embedding, so a
+    rephrased repeat of an earlier question skips retrieval and synthesis.
+    """
+    cached, vector, version = cached_answer(query)
+    if cached is not None:
+        return cached
+
+    engine = query_engine()
+    # The embedding from the cache lookup is reused, so retrieval does not embed again
+    bundle = QueryBundle(query, embedding=vector)
+    with span("retrieve") as attrs:
+        nodes = engine.retrieve(bundle)
+        attrs["nodes"] = len(nodes)
+    with span("synthesize"):
+        response = engine.synthesize(bundle, nodes)
+
+    result = {
+        "answer": str(response),
+        "sources": source_list(response.source_nodes, query)
+    }
+    remember_answer(vector, version, result)
+    return result
+
+
+def stream_documents(query):
+    """
+    Streaming query_documents. Yields ("sources", [...]) once retrieval is done,
+    then ("token", text) as the LLM produces the answer, then ("done", {...}).
+    """
+    cached, vector, version = cached_answer(query)
+    if cached is not None:
+        yield "sources", cached["sources"]
+        yield "token", cached["answer"]
+        yield "done", {"cached": True}
+        return
+
+    engine = query_engine(streaming=True)
+    bundle = QueryBundle(query, embedding=vector)
+    with span("retrieve") as attrs:
+        nodes = engine.retrieve(bundle)
+        attrs["nodes"] = len(nodes)
+    response = engine.synthesize(bundle, nodes)
+    sources = source_list(response.source_nodes, query)
+    yield "sources", sources
+
+    parts = []
+    for token in response.response_gen:
+        parts.append(token)
+        yield "token", token
+
+    remember_answer(vector, version, {"answer": "".join(parts), "sources": sources})
+    yield "done", {"cached": False}
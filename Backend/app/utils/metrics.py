@@ -0,0 +1,274 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from flask import Response, g, request
+
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'syngenta_'
+# Seconds; upstream model calls dominate, so the range reaches well past a minute
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+SIZE_BUCKETS = tuple(4 ** i for i in range(2, 12))
+QUANTILES = (0.5, 0.95, 0.99)
+
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Histogram:
+    """
+    Cumulative buckets, sum and count (Prometheus histogram), plus a window of
+    recent observations for p50/p95/p99 without having to pick bucket bounds.
+    """
+
+    def __init__(self, buckets, window):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self):
+        if not self.recent:
+            return {q: 0.0 for q in QUANTILES}
+        values = np.quantile(np.fromiter(self.recent, float, len(self.recent)), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """In-process counters, gauges and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, help=None, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets, self.window)
+            histogram.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def inc(self, name, value=1, help=None, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def set(self, name, value, help=None, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+            if help:
+                self._help.setdefault(name, help)
+
+    def summary(self, name):
+        """{labels: {count, sum, p50, p95, p99}} for one histogram, for logs and JSON views."""
+        with self._lock:
+            series = dict(self._histograms.get(name, {}))
+        out = {}
+        for key, histogram in series.items():
+            q = histogram.quantiles()
+            out[','.join(f'{k}={v}' for k, v in key) or 'all'] = {
+                'count': histogram.count, 'sum': round(histogram.sum, 6),
+                'p50': q[0.5], 'p95': q[0.95], 'p99': q[0.99],
+            }
+        return out
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{PREFIX}{name}{_format_labels(key)} {_number(value)}')
+            for name, series in sorted(self._gauges.items()):
+                self._header(lines, name, 'gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{PREFIX}{name}{_format_labels(key)} {_number(value)}')
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{PREFIX}{name}_bucket{_format_labels(key, [("le", _number(bound))])} '
+                                     f'{cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(key)} {_number(histogram.sum)}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(key)} {histogram.count}')
+                # Quantiles over the recent window, as a separate gauge family
+                lines.append(f'# HELP {PREFIX}{name}_recent Quantiles of the last {self.window} observations')
+                lines.append(f'# TYPE {PREFIX}{name}_recent gauge')
+                for key, histogram in sorted(series.items()):
+                    for q, value in histogram.quantiles().items():
+                        lines.append(f'{PREFIX}{name}_recent{_format_labels(key, [("quantile", q)])} '
+                                     f'{_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        if name in self._help:
+            lines.append(f'# HELP {PREFIX}{name} {self._help[name]}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = MetricsRegistry()
+
+
+class Trace:
+    """Spans recorded while handling one request; written as one JSON line when enabled."""
+
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage, start, seconds, attrs):
+        self.spans.append({'stage': stage, 'start': round(start - self._start, 6),
+                           'seconds': round(seconds, 6), **attrs})
+
+    def to_dict(self):
+        return {'trace_id': self.id, 'name': self.name, 'started_at': self.started_at,
+                'seconds': round(time.perf_counter() - self._start, 6), **self.attrs,
+                'spans': sorted(self.spans, key=lambda s: s['start'])}
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time a pipeline stage: observed into stage_seconds{stage} and, inside a
+    traced request, appended to its trace. Keys added to the yielded dict
+    (sizes, token counts, cache flags) end up in the trace too.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = e.__class__.__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe('stage_seconds', seconds, help='Time spent per pipeline stage',
+                        stage=stage, error=error)
+        trace = _trace.get()
+        if trace is not None:
+            if error:
+                attrs['error'] = error
+            trace.add(stage, start, seconds, attrs)
+
+
+def bind(fn):
+    """
+    fn running in a copy of the caller's context, so spans recorded in a worker
+    thread join the current trace. Bind once per submit: a context can only be
+    entered by one thread at a time.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
+
+
+def current_trace():
+    return _trace.get()
+
+
+_trace_lock = threading.Lock()
+
+
+def _write_trace(path, trace):
+    line = json.dumps(trace.to_dict(), default=str)
+    try:
+        with _trace_lock, open(path, 'a') as fh:
+            fh.write(line + '\n')
+    except OSError as e:
+        logger.warning(f"Could not write trace to {path}: {e}")
+
+
+def init_app(app):
+    """Time every request, trace the query pipeline and serve /metrics."""
+    traced = tuple(app.config['TRACE_PATHS'])
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        # Set on every request (not reset after it) so a streamed body, which is
+        # generated after after_request, still records into its own trace
+        g.trace = Trace(request.path, method=request.method) if request.path in traced else None
+        _trace.set(g.trace)
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop('request_started', None)
+        trace = g.pop('trace', None)
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        if trace is not None:
+            response.headers['X-Trace-Id'] = trace.id
+
+        def finish():
+            # After the body is sent, so streamed responses are timed to the last token
+            if started is not None:
+                metrics.observe('request_seconds', time.perf_counter() - started,
+                                help='Request handling time', endpoint=endpoint,
+                                method=method, status=response.status_code)
+            if trace is not None and app.config['TRACE_LOG']:
+                trace.attrs['status'] = response.status_code
+                _write_trace(app.config['TRACE_LOG'], trace)
+        response.call_on_close(finish)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,139 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def fan_out(fn, max_workers, name='fan-out'):
+    """
+    Batch handler for endpoints that take one item per call: maps fn over the
+    batch on a shared bounded pool. Failures are returned in place so one bad
+    item does not fail the rest of its batch.
+    """
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def handler(items):
+        futures = [pool.submit(fn, item) for item in items]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    return handler
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batches. A caller's item waits
+    at most max_wait seconds (or until max_batch items are queued) before the
+    batch goes to handler(items) -> outcomes, one per item in order; an outcome
+    that is an Exception is raised to that caller only. Items with the same
+    key (identical questions from concurrent requests) share one slot.
+    At most `workers` batches run at a time.
+    """
+
+    def __init__(self, handler, max_batch=32, max_wait=0.005, workers=2, key=None, name='batch'):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.key = key or (lambda item: item)
+        self.name = name
+        self._queue = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+
+    @classmethod
+    def from_config(cls, handler, config=Config, **kwargs):
+        options = {
+            'max_batch': config.MICROBATCH_MAX_SIZE,
+            'max_wait': config.MICROBATCH_WAIT_MS / 1000.0,
+            'workers': config.MICROBATCH_WORKERS,
+        }
+        options.update(kwargs)
+        return cls(handler, **options)
+
+    def _ensure_started(self):
+        """Start the dispatcher thread, again in a forked worker (threads do not survive fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+                threading.Thread(target=self._dispatch, args=(self._queue,),
+                                 name=f'{self.name}-dispatch', daemon=True).start()
+                self._pid = os.getpid()
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its outcome."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self, work):
+        """Block for the first item, then gather more until the window closes or the batch is full."""
+        batch = [work.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(work.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self, work):
+        while True:
+            batch = self._collect(work)
+            slots = {}
+            for item, future in batch:
+                if future.set_running_or_notify_cancel():
+                    slots.setdefault(self.key(item), (item, []))[1].append(future)
+            if slots:
+                self._pool.submit(self._run, list(slots.values()))
+
+    def _run(self, slots):
+        items = [item for item, _ in slots]
+        try:
+            outcomes = self.handler(items)
+            if len(outcomes) != len(items):
+                raise RuntimeError(f"{self.name} handler returned {len(outcomes)} results for {len(items)} items")
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(items)} failed: {e}")
+            outcomes = [e] * len(items)
+        with self._lock:
+            self._batches += 1
+            self._items += len(items)
+        for (_, futures), outcome in zip(slots, outcomes):
+            for future in futures:
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def stats(self):
+        return {
+            'batches': self._batches,
+            'items': self._items,
+            'avg_batch': round(self._items / self._batches, 2) if self._batches else 0.0,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+        }
@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import build_metadata_filter_fn, node_to_metadata_dict
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FNAME = 'mmap_store.json'
+VECTORS_FNAME = 'mmap_vectors.npy'
+IVF_FNAME = 'mmap_ivf.npz'
+# Rows scored per matrix product when assigning vectors to IVF lists
+ASSIGN_BLOCK = 65536
+
+
+def is_mmap_store(persist_dir):
+    return os.path.exists(os.path.join(persist_dir, MANIFEST_FNAME))
+
+
+def _unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """Indexes of the k largest scores, best first."""
+    if k >= scores.size:
+        return np.argsort(-scores)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def _node_metadata(node):
+    """Filterable metadata of a node, as SimpleVectorStore keeps it (without the node content)."""
+    metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+    metadata.pop('_node_content', None)
+    return metadata
+
+
+def _atomic_save(path, write, mode='wb'):
+    """write(fh) into a temp file, then rename it over path."""
+    tmp = path + '.tmp'
+    with open(tmp, mode) as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors: k-means centroids, and the row
+    numbers of each list stored contiguously (order[offsets[i]:offsets[i+1]]).
+    A query scores the centroids and scans only the nprobe closest lists.
+    """
+
+    def __init__(self, centroids, order, offsets, covered):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        # Rows [0, covered) are indexed; rows appended later are scanned exactly
+        self.covered = covered
+
+    @classmethod
+    def build(cls, vectors, n_lists, iterations=15, sample_size=50000, seed=0):
+        rng = np.random.default_rng(seed)
+        n = vectors.shape[0]
+        sample = vectors[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))]
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = sample[assign == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+                else:
+                    # Re-seed an empty list from a random sample row
+                    centroids[i] = sample[rng.integers(sample.shape[0])]
+            centroids = _unit_rows(centroids)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, ASSIGN_BLOCK):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK])
+            assign[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind='stable').astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, order, offsets, n)
+
+    def candidates(self, query, nprobe):
+        lists = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+    def save(self, path):
+        _atomic_save(path, lambda fh: np.savez(fh, centroids=self.centroids, order=self.order,
+                                               offsets=self.offsets, covered=self.covered))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['order'], data['offsets'], int(data['covered']))
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store whose embeddings live in one contiguous float32 .npy matrix,
+    opened with mmap so workers share the OS page cache instead of each holding
+    Python lists. Queries are one matrix-vector product (cosine similarity on
+    unit rows) plus argpartition; with an IVF index only nprobe lists are
+    scanned. Node text stays in the docstore, as with SimpleVectorStore.
+
+    Nodes added since the last persist are held in memory and scanned exactly;
+    deletes are masked until persist rewrites the matrix. Node metadata is
+    kept in the manifest for metadata filters, which are applied exactly
+    (no IVF) like doc_ids and node_ids.
+    """
+
+    stores_text: bool = False
+    ivf_lists: int = 0
+    nprobe: int = 8
+    ivf_min_size: int = 20000
+
+    _vectors: Any = PrivateAttr(default=None)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    # Per row; None for rows from a store persisted before metadata was kept
+    _metadata: List[Optional[dict]] = PrivateAttr(default_factory=list)
+    _deleted: Any = PrivateAttr(default_factory=lambda: np.zeros(0, dtype=bool))
+    _pending: List[Any] = PrivateAttr(default_factory=list)
+    _ivf: Any = PrivateAttr(default=None)
+    _rows: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs: Any) -> "MmapVectorStore":
+        store = cls(**kwargs)
+        with open(os.path.join(persist_dir, MANIFEST_FNAME)) as fh:
+            manifest = json.load(fh)
+        store._ids = manifest['ids']
+        store._ref_doc_ids = manifest['ref_doc_ids']
+        store._metadata = manifest.get('metadata') or [None] * len(store._ids)
+        if store._ids:
+            store._vectors = np.load(os.path.join(persist_dir, VECTORS_FNAME), mmap_mode='r')
+        store._deleted = np.zeros(len(store._ids), dtype=bool)
+        ivf_path = os.path.join(persist_dir, IVF_FNAME)
+        if manifest.get('ivf') and os.path.exists(ivf_path):
+            store._ivf = IVFIndex.load(ivf_path)
+        return store
+
+    @classmethod
+    def from_simple_store(cls, simple: SimpleVectorStore, **kwargs: Any) -> "MmapVectorStore":
+        store = cls(**kwargs)
+        data = simple.data
+        store._ids = list(data.embedding_dict)
+        store._ref_doc_ids = [data.text_id_to_ref_doc_id.get(node_id) for node_id in store._ids]
+        store._metadata = [(data.metadata_dict or {}).get(node_id) for node_id in store._ids]
+        if store._ids:
+            store._vectors = _unit_rows([data.embedding_dict[node_id] for node_id in store._ids])
+        store._deleted = np.zeros(len(store._ids), dtype=bool)
+        return store
+
+    def count(self):
+        """Live vectors (not __len__: an empty store must stay truthy for StorageContext)."""
+        return len(self._ids) - int(self._deleted.sum())
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        self._pending.append(_unit_rows([node.get_embedding() for node in nodes]))
+        self._ids.extend(node.node_id for node in nodes)
+        self._ref_doc_ids.extend(node.ref_doc_id for node in nodes)
+        self._metadata.extend(_node_metadata(node) for node in nodes)
+        self._deleted = np.concatenate([self._deleted, np.zeros(len(nodes), dtype=bool)])
+        self._rows = None
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for row, doc_id in enumerate(self._ref_doc_ids):
+            if doc_id == ref_doc_id:
+                self._deleted[row] = True
+
+    def _persisted_rows(self):
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _row_vector(self, row):
+        persisted = self._persisted_rows()
+        if row < persisted:
+            return self._vectors[row]
+        row -= persisted
+        for block in self._pending:
+            if row < block.shape[0]:
+                return block[row]
+            row -= block.shape[0]
+        raise IndexError(row)
+
+    def vectors_for(self, node_ids):
+        """Stored (unit) vectors for node_ids, None for ids that are unknown or deleted."""
+        if self._rows is None:
+            self._rows = {node_id: row for row, node_id in enumerate(self._ids)}
+        out = []
+        for node_id in node_ids:
+            row = self._rows.get(node_id)
+            out.append(None if row is None or self._deleted[row] else self._row_vector(row))
+        return out
+
+    def _scores(self, query, rows=None):
+        """Scores for all rows (or the given row numbers) across the mmap and pending blocks."""
+        persisted = self._persisted_rows()
+        if rows is None:
+            blocks = [] if self._vectors is None else [self._vectors @ query]
+            blocks.extend(block @ query for block in self._pending)
+            return np.arange(len(self._ids)), np.concatenate(blocks) if blocks else np.zeros(0, np.float32)
+        rows = np.sort(rows)
+        return rows, self._vectors[rows] @ query if persisted else np.zeros(0, np.float32)
+
+    def _filter_mask(self, rows, filters):
+        if any(self._metadata[r] is None for r in rows):
+            raise ValueError("Cannot filter a vector store persisted without metadata; "
+                             "rebuild it (flask documents ingest --full) to enable filters")
+        matches = build_metadata_filter_fn(lambda r: self._metadata[r], filters)
+        return np.fromiter((matches(r) for r in rows), bool, len(rows))
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if not self._ids or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        vector = _unit_rows([query.query_embedding])[0]
+        top_k = query.similarity_top_k
+        use_ivf = (self._ivf is not None and not query.doc_ids and not query.node_ids
+                   and query.filters is None and self._ivf.covered == self._persisted_rows())
+        if use_ivf:
+            rows, scores = self._scores(vector, self._ivf.candidates(vector, self.nprobe))
+            pending_scores = [block @ vector for block in self._pending]
+            if pending_scores:
+                rows = np.concatenate([rows, np.arange(self._ivf.covered, len(self._ids))])
+                scores = np.concatenate([scores] + pending_scores)
+        else:
+            rows, scores = self._scores(vector)
+
+        mask = ~self._deleted[rows]
+        if query.doc_ids:
+            allowed = set(query.doc_ids)
+            mask &= np.fromiter((self._ref_doc_ids[r] in allowed for r in rows), bool, len(rows))
+        if query.node_ids:
+            allowed = set(query.node_ids)
+            mask &= np.fromiter((self._ids[r] in allowed for r in rows), bool, len(rows))
+        if query.filters is not None:
+            mask &= self._filter_mask(rows, query.filters)
+        rows, scores = rows[mask], scores[mask]
+
+        best = _top_k(scores, top_k)
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(scores[i]) for i in best],
+            ids=[self._ids[rows[i]] for i in best],
+        )
+
+    def build_ivf(self, n_lists=None):
+        """(Re)build the approximate index over the persisted rows; n_lists defaults to ~sqrt(rows)."""
+        rows = self._persisted_rows()
+        n_lists = n_lists or self.ivf_lists or max(1, int(np.sqrt(rows)))
+        if rows < max(self.ivf_min_size, n_lists):
+            self._ivf = None
+            return None
+        self._ivf = IVFIndex.build(self._vectors, n_lists)
+        return self._ivf
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """
+        Write to the directory of persist_path (the path StorageContext passes
+        for the default vector store file), compacting deletes and folding
+        pending rows into the matrix.
+        """
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        keep = ~self._deleted
+        blocks = [] if self._vectors is None else [np.asarray(self._vectors)]
+        blocks.extend(self._pending)
+        matrix = np.concatenate(blocks)[keep] if blocks else np.zeros((0, 0), np.float32)
+        ids = [node_id for node_id, k in zip(self._ids, keep) if k]
+        ref_doc_ids = [doc_id for doc_id, k in zip(self._ref_doc_ids, keep) if k]
+        metadata = [meta for meta, k in zip(self._metadata, keep) if k]
+
+        vectors_path = os.path.join(persist_dir, VECTORS_FNAME)
+        _atomic_save(vectors_path, lambda fh: np.save(fh, matrix))
+        self._ids, self._ref_doc_ids, self._metadata, self._pending = ids, ref_doc_ids, metadata, []
+        self._rows = None
+        self._deleted = np.zeros(len(ids), dtype=bool)
+        self._vectors = np.load(vectors_path, mmap_mode='r') if ids else None
+
+        ivf = self.build_ivf() if ids else None
+        if ivf is not None:
+            ivf.save(os.path.join(persist_dir, IVF_FNAME))
+        manifest = {'dim': int(matrix.shape[1]) if ids else None, 'count': len(ids),
+                    'ids': ids, 'ref_doc_ids': ref_doc_ids, 'metadata': metadata, 'ivf': ivf is not None}
+        _atomic_save(os.path.join(persist_dir, MANIFEST_FNAME), lambda fh: json.dump(manifest, fh), mode='w')
+        logger.info(f"Persisted {len(ids)} vectors to {persist_dir}"
+                    f"{' with IVF' if ivf is not None else ''}")
+
+
+def convert_simple_store(persist_dir, **kwargs):
+    """
+    Convert the default JSON vector store in persist_dir into the mmap layout
+    next to it. docstore/index_store are reused unchanged; the JSON file is
+    kept so the conversion can be rolled back by deleting the mmap files.
+    """
+    simple = SimpleVectorStore.from_persist_dir(persist_dir)
+    store = MmapVectorStore.from_simple_store(simple, **kwargs)
+    store.persist(os.path.join(persist_dir, 'default__vector_store.json'))
+    return store
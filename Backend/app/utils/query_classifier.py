@@ -1,9 +1,21 @@
+import logging
+import re
+import threading
+from datetime import datetime
+
 from langchain.llms.base import LLM
 from langchain.prompts import PromptTemplate
-from typing import Optional, List
-import requests
-import json
+from typing import Optional, List, Any
+from flask import has_app_context
 from app.config import Config
+from app.extensions import db
+from app.models.user import Order, QueryLabel
+from app.utils.http_transport import transport
+from app.utils.lru_cache import LRUCache
+from app.utils.micro_batch import MicroBatcher, fan_out
+from app.utils.text_classifier import TfidfLogisticRegression
+
+logger = logging.getLogger(__name__)
 
 # 👇 Step 1: Custom LangChain-compatible LLM using your Lambda Claude API
 class CustomBedrockLLM(LLM):
@@ -17,8 +29,8 @@ class CustomBedrockLLM(LLM):
     def _llm_type(self) -> str:
         return "custom-bedrock-claude"
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        payload = {
+    def _payload(self, prompt: str) -> dict:
+        return {
             "api_key": self.api_key,
             "prompt": prompt,
             "model_id": self.model_id,
@@ -27,18 +39,19 @@ class CustomBedrockLLM(LLM):
                 "temperature": self.temperature
             }
         }
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(self.url, headers=headers, data=json.dumps(payload))
 
-        if response.status_code != 200:
-            raise Exception(f"API Error: {response.text}")
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        result = transport.post_json(self.url, self._payload(prompt))
+        return result["response"]["content"][0]["text"]
 
-        return response.json()["response"]["content"][0]["text"]
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        result = await transport.apost_json(self.url, self._payload(prompt))
+        return result["response"]["content"][0]["text"]
 
 
 # 👇 Step 2: Setup your LLM
 llm = CustomBedrockLLM(
-    url="https://quchnti6xu7yzw7hfzt5yjqtvi0kafsq.lambda-url.eu-central-1.on.aws/",
+    url=Config.MODEL_ENDPOINT_URL,
     api_key=Config.BEDROCK_API_KEY,  # 🔐 Replace this
     model_id="claude-3.5-sonnet"
 )
@@ -70,7 +83,185 @@ User query: {query}
 classifier_chain = prompt_template | llm
 
 
-def queryClassifier(query):
-    result = classifier_chain.invoke(query).strip().lower()
-    return result
+def normalize_question(question):
+    return re.sub(r'\s+', ' ', question.strip().lower()).rstrip('?.! ')
+
+
+# --- tier 1: rules over the orders vocabulary --------------------------------
+
+LABELS = ('document', 'sql', 'hybrid')
+
+# Column-name words from the orders table, minus ones too generic (or too odd) to mean "the data"
+IGNORED_WORDS = {'order', 'orders', 'name', 'id', 'type', 'per', 'real', 'status', 'date', 'item',
+                 'card', 'cardprod', 'description', 'email', 'fname', 'lname', 'image', 'password',
+                 'street', 'zipcode'}
+SCHEMA_TERMS = sorted(
+    {word for column in Order.__table__.columns for word in column.name.split('_')
+     if len(word) > 3 and word not in IGNORED_WORDS}
+    | {'revenue', 'orders', 'shipments', 'deliveries', 'late', 'shipping', 'delivery'}
+)
+SCHEMA_CUE = re.compile(r'\b(' + '|'.join(map(re.escape, SCHEMA_TERMS)) + r')s?\b', re.IGNORECASE)
+AGGREGATE_CUE = re.compile(
+    r'\b(how many|number of|count|total|sum|average|avg|mean|median|top \d+|highest|lowest|most|least|'
+    r'rank(ing)?|trend|per (month|year|market|region|category)|by (month|year|market|region|category|'
+    r'shipping mode|customer segment)|percentage|ratio|rate|compare)\b',
+    re.IGNORECASE,
+)
+DOCUMENT_CUE = re.compile(
+    r'\b(polic(y|ies)|document(s|ation)?|guidelines?|procedures?|sops?|manuals?|handbook|contracts?|'
+    r'regulations?|compliance|code of conduct|standards?|according to|summari[sz]e|explain|'
+    r'what does .* say|clause|terms and conditions)\b',
+    re.IGNORECASE,
+)
+
+
+def rule_label(query):
+    """(label, confidence) from keyword rules, or (None, 0.0) when no rule fires."""
+    data = bool(AGGREGATE_CUE.search(query)) and bool(SCHEMA_CUE.search(query))
+    document = bool(DOCUMENT_CUE.search(query))
+    if data and document:
+        # Mixed cues are often but not always hybrid; let the model or LLM confirm
+        return 'hybrid', 0.75
+    if data:
+        return 'sql', 0.9
+    if document and not SCHEMA_CUE.search(query):
+        return 'document', 0.9
+    return None, 0.0
+
+
+# --- tier 2: TF-IDF + logistic regression trained on past LLM labels ---------
+
+_model = None
+_model_examples = 0
+_training = False
+_loaded = False
+_train_lock = threading.Lock()
+_decisions = LRUCache(maxsize=Config.CLASSIFIER_CACHE_SIZE)
+
+
+def model_label(query):
+    model = _model
+    if model is None:
+        return None, 0.0
+    return model.predict(query)
+
+
+def _train(texts, labels, count):
+    global _model, _model_examples, _training
+    try:
+        model = TfidfLogisticRegression().fit(texts, labels)
+        _model, _model_examples = model, count
+        logger.info(f"Trained query classifier on {len(texts)} labelled queries")
+    except Exception as e:
+        logger.warning(f"Query classifier training failed: {e}")
+    finally:
+        _training = False
 
+
+def maybe_retrain(force=False):
+    """Refit the local model in the background once enough new labels have been logged."""
+    global _training
+    if not has_app_context():
+        return
+    count = QueryLabel.query.count()
+    if count < Config.CLASSIFIER_MIN_EXAMPLES:
+        return
+    if not force and _model is not None and count - _model_examples < Config.CLASSIFIER_RETRAIN_EVERY:
+        return
+    with _train_lock:
+        if _training:
+            return
+        _training = True
+    rows = (db.session.query(QueryLabel.normalized, QueryLabel.label)
+            .order_by(QueryLabel.id.desc()).limit(Config.CLASSIFIER_MAX_EXAMPLES).all())
+    latest = {}
+    for normalized, label in rows:
+        latest.setdefault(normalized, label)
+    if len(set(latest.values())) < 2:
+        _training = False
+        return
+    threading.Thread(target=_train, args=(list(latest), list(latest.values()), count),
+                     name='classifier-train', daemon=True).start()
+
+
+# --- tier 3: the LLM ----------------------------------------------------------
+
+def _ask_llm(query):
+    raw = classifier_chain.invoke(query).strip().lower()
+    match = re.search(r'\b(document|sql|hybrid)\b', raw)
+    return match.group(1) if match else raw
+
+
+# The endpoint takes one prompt per call: concurrent prompts are fanned out
+# over a pool no larger than the HTTP connection pool, and identical
+# questions arriving together share a single call
+_batcher = MicroBatcher.from_config(
+    fan_out(_ask_llm, Config.HTTP_POOL_SIZE, name='classify'),
+    key=normalize_question, name='classify-batch',
+) if Config.MICROBATCH_ENABLED else None
+
+
+def llm_label(query):
+    return _batcher(query) if _batcher is not None else _ask_llm(query)
+
+
+def _record(query, normalized, label):
+    if not has_app_context() or label not in LABELS:
+        return
+    try:
+        db.session.add(QueryLabel(question=query, normalized=normalized[:1000], label=label,
+                                  source='llm', created_at=datetime.utcnow()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not log query label: {e}")
+        return
+    maybe_retrain()
+
+
+def classify_locally(query):
+    """
+    (label, source) from the memo, the rules or the local model, or
+    (None, None) when none of them is confident enough to skip the LLM.
+    """
+    global _loaded
+    normalized = normalize_question(query)
+    label = _decisions.get(normalized)
+    if label is not None:
+        return label, 'memo'
+    if not _loaded:
+        _loaded = True
+        maybe_retrain()
+
+    threshold = Config.CLASSIFIER_CONFIDENCE
+    label, confidence = rule_label(query)
+    if confidence >= threshold:
+        return label, 'rules'
+    model_guess, model_confidence = model_label(normalized)
+    if model_confidence >= threshold:
+        return model_guess, 'model'
+    return None, None
+
+
+def remember(query, label, source):
+    """Memoize a decision; LLM decisions are also logged as training examples."""
+    normalized = normalize_question(query)
+    if source == 'llm':
+        _record(query, normalized, label)
+    logger.info(f"Classified query as {label} via {source}")
+    if label in LABELS:
+        _decisions.set(normalized, label)
+
+
+def queryClassifier(query):
+    """
+    document / sql / hybrid. Rules first, then the local model, and the LLM
+    only when neither is confident; decisions are memoized per normalized query.
+    """
+    label, source = classify_locally(query)
+    if source == 'memo':
+        return label
+    if label is None:
+        label, source = llm_label(query), 'llm'
+    remember(query, label, source)
+    return label
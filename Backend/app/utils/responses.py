@@ -0,0 +1,110 @@
+import gzip
+import logging
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from app.utils.metrics import SIZE_BUCKETS, metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson: several times faster than the stdlib
+    encoder and straight to bytes. Keys keep insertion order (no sort) and
+    non-ASCII text is sent as UTF-8. Types orjson does not handle natively go
+    through Flask's default(), so dates still serialize as HTTP dates.
+    """
+
+    sort_keys = False
+    ensure_ascii = False
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+               | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _dump_bytes(self, obj, indent=False):
+        return orjson.dumps(obj, default=self.default,
+                            option=self.options | (orjson.OPT_INDENT_2 if indent else 0))
+
+    def dumps(self, obj, **kwargs):
+        # Calls with stdlib-specific arguments (cls, separators, ...) keep the stdlib path
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dump_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def _encoding(accept_encodings):
+    """The best coding the client accepts among the ones available here, or None."""
+    offered = (['br'] if brotli else []) + ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def _compressible(response, min_bytes):
+    if response.direct_passthrough or response.is_streamed:
+        # Files and streamed answers: compressing would buffer the whole body
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if not response.mimetype.startswith(COMPRESSIBLE):
+        return False
+    return response.content_length is not None and response.content_length >= min_bytes
+
+
+def compress(body, coding, config):
+    if coding == 'br':
+        return brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'])
+
+
+def init_app(app):
+    """orjson for jsonify/request.get_json, and gzip or brotli by Accept-Encoding."""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        logger.info("orjson is not installed, using the standard JSON encoder")
+
+    @app.after_request
+    def _compress_response(response):
+        # Set even on uncompressed answers, so caches keep one copy per coding
+        response.vary.add('Accept-Encoding')
+        if not _compressible(response, app.config['COMPRESS_MIN_BYTES']):
+            return response
+        coding = _encoding(request.accept_encodings)
+        if coding is None:
+            return response
+        body = response.get_data()
+        compressed = compress(body, coding, app.config)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = coding
+        metrics.observe('response_bytes', len(body), buckets=SIZE_BUCKETS,
+                        help='Response body size before and after compression', coding='identity')
+        metrics.observe('response_bytes', len(compressed), buckets=SIZE_BUCKETS, coding=coding)
+        return response
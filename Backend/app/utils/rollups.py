@@ -0,0 +1,197 @@
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import and_, case, extract, func, or_, select
+
+from app.extensions import db
+from app.models.user import Order, OrderRollup
+
+logger = logging.getLogger(__name__)
+
+# Months per DELETE/INSERT statement, keeps the OR lists short
+REFRESH_BATCH = 24
+
+# rollup column -> expression over orders
+DIMENSIONS = {
+    'order_year': extract('year', Order.order_date),
+    'order_month': extract('month', Order.order_date),
+    'market': Order.market,
+    'order_region': Order.order_region,
+    'category_name': Order.category_name,
+    'shipping_mode': Order.shipping_mode,
+}
+
+MEASURES = {
+    'order_count': func.count(Order.id),
+    'sales_sum': func.sum(Order.sales),
+    'profit_sum': func.sum(Order.order_profit_per_order),
+    'late_risk_sum': func.sum(Order.late_delivery_risk),
+    'late_delivery_count': func.sum(case((Order.delivery_status == 'Late delivery', 1), else_=0)),
+    'days_real_sum': func.sum(Order.days_for_shipping_real),
+    'shipping_delay_sum': func.sum(Order.days_for_shipping_real - Order.days_for_shipment_scheduled),
+}
+
+
+def _month_filters(months):
+    """(orders condition, rollup condition) covering the given (year, month) pairs."""
+    rollup = OrderRollup.__table__.c
+    order_conds, rollup_conds = [], []
+    for year, month in months:
+        if year is None:
+            order_conds.append(Order.order_date.is_(None))
+            rollup_conds.append(rollup.order_year.is_(None))
+            continue
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        order_conds.append(and_(Order.order_date >= start, Order.order_date < end))
+        rollup_conds.append(and_(rollup.order_year == year, rollup.order_month == month))
+    return or_(*order_conds), or_(*rollup_conds)
+
+
+def _insert_cells(where=None):
+    stmt = select(*DIMENSIONS.values(), *MEASURES.values())
+    if where is not None:
+        stmt = stmt.where(where)
+    stmt = stmt.group_by(*DIMENSIONS.values())
+    db.session.execute(
+        OrderRollup.__table__.insert().from_select(list(DIMENSIONS) + list(MEASURES), stmt)
+    )
+
+
+def refresh_rollups(months=None):
+    """
+    Recompute rollup cells. With months (an iterable of (year, month) pairs)
+    only those months are rebuilt; with None the whole cube is. An empty cube
+    over a non-empty orders table is always rebuilt in full.
+    """
+    table = OrderRollup.__table__
+    if db.session.query(OrderRollup.id).first() is None:
+        if db.session.query(Order.id).first() is None:
+            return
+        months = None
+    elif months is not None and not months:
+        return
+
+    if months is None:
+        db.session.execute(table.delete())
+        _insert_cells()
+        db.session.commit()
+        logger.info("Rebuilt order rollups")
+        return
+
+    months = sorted(set(months), key=lambda m: (m[0] is None, m))
+    for start in range(0, len(months), REFRESH_BATCH):
+        order_cond, rollup_cond = _month_filters(months[start:start + REFRESH_BATCH])
+        db.session.execute(table.delete().where(rollup_cond))
+        _insert_cells(order_cond)
+    db.session.commit()
+    logger.info(f"Refreshed order rollups for {len(months)} month(s)")
+
+
+# --- answering questions from the cube -------------------------------------
+
+GROUPING_CUE = re.compile(r'\b(by|per|each|across|breakdown|split)\b', re.IGNORECASE)
+
+# Anything the cube cannot filter or group on sends the question to the LLM
+UNSUPPORTED = re.compile(
+    r'\b(customers?|products?|cit(y|ies)|countr(y|ies)|states?|departments?|where|only|'
+    r'excluding|except|between|without|discount|quantity|price|latitude|longitude)\b',
+    re.IGNORECASE,
+)
+# Words that carry no filter or measure; any other word left over after the
+# measure, dimension and ordering phrases are taken out means the cube
+# cannot answer the question as asked ("for europe", "last year", "in 2017")
+FILLER_WORDS = set("""
+    a an the and of in on for to with by per each across breakdown split grouped group broken down
+    all our overall total totals sum what what's whats which is are was were show me list give tell
+    get find please there order orders delivery deliveries value values amount figures numbers
+    ranked rank ranking sorted
+""".split())
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+DIMENSION_WORDS = [
+    (re.compile(r'\bmarkets?\b', re.IGNORECASE), ['market']),
+    (re.compile(r'\bregions?\b', re.IGNORECASE), ['order_region']),
+    (re.compile(r'\bcategor(y|ies)\b', re.IGNORECASE), ['category_name']),
+    (re.compile(r'\bshipping (modes?|class(es)?|methods?)\b', re.IGNORECASE), ['shipping_mode']),
+    (re.compile(r'\b(months?|monthly)\b', re.IGNORECASE), ['order_year', 'order_month']),
+    (re.compile(r'\b(years?|yearly|annual(ly)?)\b', re.IGNORECASE), ['order_year']),
+]
+
+LATE_RATE = re.compile(r'\b(rate|risk|percent(age)?|share|ratio)\b', re.IGNORECASE)
+
+MEASURE_WORDS = [
+    (re.compile(r'\b(sales|revenue)\b', re.IGNORECASE),
+     'ROUND(SUM(sales_sum), 2)', 'total_sales'),
+    (re.compile(r'\bprofits?\b', re.IGNORECASE),
+     'ROUND(SUM(profit_sum), 2)', 'total_profit'),
+    (re.compile(r'\b((average|avg|mean) )?((shipping )?(delays?|delayed days)\b|days to ship\b)', re.IGNORECASE),
+     'ROUND(1.0 * SUM(shipping_delay_sum) / SUM(order_count), 2)', 'avg_shipping_delay_days'),
+    (re.compile(r'\blate\b', re.IGNORECASE), None, None),
+]
+ORDER_COUNT = re.compile(r'\b(number of orders|how many|order count|count)\b', re.IGNORECASE)
+TOP_N = re.compile(r'\b(?:top|bottom)\s+(\d+)\b', re.IGNORECASE)
+DESCENDING = re.compile(r'\b(top|highest|most|best|largest|biggest)\b', re.IGNORECASE)
+ASCENDING = re.compile(r'\b(bottom|lowest|least|worst|smallest)\b', re.IGNORECASE)
+
+
+def rollup_sql(question):
+    """
+    SQL over order_rollups for simple "measure by dimension" questions,
+    or None when the cube does not cover the question.
+    """
+    if not GROUPING_CUE.search(question) or UNSUPPORTED.search(question):
+        return None
+    limit = None
+    top = TOP_N.search(question)
+    if top:
+        limit = int(top.group(1))
+    # Everything understood is cut out of remainder; what is left must be filler
+    remainder = TOP_N.sub(' ', question)
+
+    dims = []
+    for pattern, columns in DIMENSION_WORDS:
+        if pattern.search(remainder):
+            dims.extend(c for c in columns if c not in dims)
+            remainder = pattern.sub(' ', remainder)
+    if not dims:
+        return None
+
+    measures = []
+    for pattern, expression, label in MEASURE_WORDS:
+        if not pattern.search(remainder):
+            continue
+        remainder = pattern.sub(' ', remainder)
+        if label is None:
+            if LATE_RATE.search(remainder):
+                remainder = LATE_RATE.sub(' ', remainder)
+                expression, label = ('ROUND(1.0 * SUM(late_delivery_count) / SUM(order_count), 4)',
+                                     'late_delivery_rate')
+            else:
+                expression, label = 'SUM(late_delivery_count)', 'late_deliveries'
+        measures.append((expression, label))
+    if ORDER_COUNT.search(remainder) or not measures:
+        if not measures and not re.search(r'\borders?\b', question, re.IGNORECASE):
+            return None
+        measures.append(('SUM(order_count)', 'order_count'))
+    for pattern in (ORDER_COUNT, GROUPING_CUE, DESCENDING, ASCENDING):
+        remainder = pattern.sub(' ', remainder)
+    leftover = [w for w in WORD.findall(remainder.lower()) if w not in FILLER_WORDS]
+    if leftover:
+        logger.debug(f"Rollups cannot answer {question!r}, unmatched words: {leftover}")
+        return None
+
+    select_list = ', '.join(dims + [f"{expr} AS {label}" for expr, label in measures])
+    sql = f"SELECT {select_list} FROM order_rollups GROUP BY {', '.join(dims)}"
+    if DESCENDING.search(question):
+        sql += f" ORDER BY {measures[0][1]} DESC"
+    elif ASCENDING.search(question):
+        sql += f" ORDER BY {measures[0][1]} ASC"
+    elif 'order_year' in dims:
+        sql += f" ORDER BY {', '.join(d for d in dims if d in ('order_year', 'order_month'))}"
+    else:
+        sql += f" ORDER BY {measures[0][1]} DESC"
+    if limit:
+        sql += f" LIMIT {limit}"
+    return sql
@@ -0,0 +1,124 @@
+import json
+import logging
+import re
+import time
+
+from flask import current_app
+from llama_index.core import QueryBundle
+
+from app.config import Config
+from app.utils.http_transport import deadline
+from app.utils.llama_index import cached_answer, custom_llm, query_engine, remember_answer, source_list
+from app.utils.metrics import span
+from app.utils.query_classifier import LABELS, classify_locally, queryClassifier, remember
+
+logger = logging.getLogger(__name__)
+
+JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+ROUTE_AND_ANSWER_PROMPT = """You route and answer questions for a supply-chain assistant.
+
+Routes:
+- "document": answered from company documents (policies, procedures, reports)
+- "sql": needs structured orders data (totals, counts, averages, rankings, filters)
+- "hybrid": needs both documents and orders data
+
+Document excerpts retrieved for the question:
+{context}
+
+If the route is "document" and the excerpts are enough, answer the question
+from them. Otherwise leave "answer" empty.
+
+Respond ONLY with JSON: {{"route": "document" | "sql" | "hybrid", "answer": "..."}}
+
+Question: {question}
+"""
+
+
+def _retrieve(query, vector, speculative=True):
+    with span('retrieve', speculative=speculative) as attrs:
+        nodes = query_engine().retrieve(QueryBundle(query, embedding=vector))
+        attrs['nodes'] = len(nodes)
+    return nodes
+
+
+def _speculate(query):
+    """Embedding, answer-cache lookup and retrieval, done before the route is known."""
+    cached, vector, version = cached_answer(query)
+    if cached is not None:
+        return cached, [], vector, version
+    return None, _retrieve(query, vector), vector, version
+
+
+def _synthesize(query, nodes):
+    with span('synthesize'):
+        response = query_engine().synthesize(QueryBundle(query), nodes)
+    return {'answer': str(response), 'sources': source_list(response.source_nodes, query)}
+
+
+def _route_and_answer(query, nodes):
+    """One LLM call that both classifies and, for document questions, answers. (route, answer) or (None, None)."""
+    context = '\n\n'.join(f"[{i}] {node.node.get_text()}" for i, node in enumerate(nodes, 1)) or '(none)'
+    raw = custom_llm.complete(ROUTE_AND_ANSWER_PROMPT.format(context=context, question=query),
+                              max_tokens=Config.ROUTER_MAX_TOKENS, temperature=0.0).text
+    match = JSON_OBJECT.search(raw)
+    try:
+        decision = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        decision = {}
+    route = str(decision.get('route', '')).strip().lower()
+    if route not in LABELS:
+        logger.warning(f"Router returned no usable route: {raw[:200]}")
+        return None, None
+    return route, (decision.get('answer') or '').strip()
+
+
+def route_query(query):
+    """
+    Speculative routing. The local classifier runs first (it takes
+    milliseconds), so sql and hybrid questions never pay for an embedding or a
+    retrieval. Otherwise retrieval runs before the route is known; when the
+    local tiers were not confident, a single LLM call classifies and answers
+    from the retrieved context. Returns (query_type, result), where result is
+    the finished document answer or None when the caller still has to run the
+    sql/hybrid path.
+    """
+    with span('classify', local=True) as attrs:
+        label, source = classify_locally(query)
+        attrs['label'], attrs['source'] = label, source
+    if label in ('sql', 'hybrid'):
+        if source != 'memo':
+            remember(query, label, source)
+        return label, None
+
+    try:
+        with deadline(time.monotonic() + current_app.config['ROUTER_RETRIEVAL_TIMEOUT']):
+            cached, nodes, vector, version = _speculate(query)
+    except Exception as e:
+        logger.warning(f"Speculative retrieval failed, routing classically: {e}")
+        return label or queryClassifier(query), None
+
+    if cached is not None:
+        if label == 'document':
+            if source != 'memo':
+                remember(query, label, source)
+            return 'document', cached
+        # A near-duplicate of an earlier document question may still need sql or
+        # hybrid, so the hit does not decide the route; retrieve and route as usual
+        nodes = _retrieve(query, vector, speculative=False)
+
+    if label is None:
+        route, answer = _route_and_answer(query, nodes)
+        if route is None:
+            return queryClassifier(query), None
+        remember(query, route, 'llm')
+        if route != 'document':
+            return route, None
+        result = {'answer': answer, 'sources': source_list(nodes, query)} if answer else _synthesize(query, nodes)
+    else:
+        if source != 'memo':
+            remember(query, label, source)
+        result = _synthesize(query, nodes)
+
+    remember_answer(vector, version, result)
+    return 'document', result
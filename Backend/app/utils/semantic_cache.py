@@ -0,0 +1,102 @@
+import threading
+import time
+
+import numpy as np
+
+from app.config import Config
+
+
+class SemanticCache:
+    """
+    Answers keyed by query embedding: a lookup returns the stored answer of the
+    most similar earlier query when cosine similarity reaches threshold.
+    Entries expire after ttl seconds and are all dropped when the version
+    (e.g. the vector store's) changes. Vectors sit in one preallocated
+    matrix, so a lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, maxsize=1000, threshold=0.95, ttl=3600):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._payloads = [None] * maxsize
+        self._expires = np.zeros(maxsize)
+        self._last_used = np.zeros(maxsize)
+        self._version = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=Config):
+        if not config.ANSWER_CACHE_ENABLED:
+            return None
+        return cls(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_THRESHOLD, config.ANSWER_CACHE_TTL)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    def _clear(self):
+        self._vectors = None
+        self._payloads = [None] * self.maxsize
+        self._expires[:] = 0
+
+    def lookup(self, vector, version=None):
+        """(payload, similarity) of the closest live entry above threshold, else None."""
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            live = self._expires > now
+            if self._vectors is None or not live.any() or self._vectors.shape[1] != query.size:
+                self.misses += 1
+                return None
+            scores = np.where(live, self._vectors @ query, -1.0)
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return self._payloads[best], float(scores[best])
+
+    def store(self, vector, payload, version=None):
+        unit = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None or self._vectors.shape[1] != unit.size:
+                self._clear()
+                self._vectors = np.zeros((self.maxsize, unit.size), dtype=np.float32)
+            # An expired slot if there is one, otherwise the least recently used
+            free = np.flatnonzero(self._expires <= now)
+            slot = int(free[0]) if free.size else int(self._last_used.argmin())
+            self._vectors[slot] = unit
+            self._payloads[slot] = payload
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        return {
+            'size': int((self._expires > time.monotonic()).sum()),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'threshold': self.threshold,
+        }
+
+
+answer_cache = SemanticCache.from_config()
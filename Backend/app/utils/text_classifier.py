@@ -0,0 +1,79 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text):
+    """Lowercase word unigrams plus bigrams."""
+    words = TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class TfidfLogisticRegression:
+    """
+    Small TF-IDF + multinomial logistic regression on NumPy, enough for the
+    few thousand short questions the query classifier learns from.
+    """
+
+    def __init__(self, max_features=2000, l2=1e-3, learning_rate=0.5, epochs=300):
+        self.max_features = max_features
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.vocabulary = {}
+        self.idf = None
+        self.labels = []
+        self.weights = None
+        self.bias = None
+
+    def _vectorize(self, texts):
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, count in Counter(tokenize(text)).items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = count
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def fit(self, texts, labels):
+        document_freq = Counter()
+        for text in texts:
+            document_freq.update(set(tokenize(text)))
+        terms = [term for term, _ in document_freq.most_common(self.max_features)]
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        df = np.array([document_freq[term] for term in terms], dtype=np.float32)
+        self.idf = np.log((1 + len(texts)) / (1 + df)) + 1
+
+        self.labels = sorted(set(labels))
+        index = {label: i for i, label in enumerate(self.labels)}
+        y = np.zeros((len(labels), len(self.labels)), dtype=np.float32)
+        y[np.arange(len(labels)), [index[label] for label in labels]] = 1
+
+        x = self._vectorize(texts)
+        self.weights = np.zeros((x.shape[1], len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(self.epochs):
+            gradient = (self._softmax(x @ self.weights + self.bias) - y) / len(texts)
+            self.weights -= self.learning_rate * (x.T @ gradient + self.l2 * self.weights)
+            self.bias -= self.learning_rate * gradient.sum(axis=0)
+        return self
+
+    @staticmethod
+    def _softmax(scores):
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts):
+        return self._softmax(self._vectorize(texts) @ self.weights + self.bias)
+
+    def predict(self, text):
+        """(label, probability) for one text."""
+        proba = self.predict_proba([text])[0]
+        best = int(proba.argmax())
+        return self.labels[best], float(proba[best])
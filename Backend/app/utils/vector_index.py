@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+
+from app.config import Config
+from app.utils.mmap_vector_store import MmapVectorStore, is_mmap_store
+
+logger = logging.getLogger(__name__)
+
+LOAD_MODES = ('lazy', 'background', 'preload')
+
+
+def store_version(persist_dir):
+    """Newest mtime among the persisted index files; changes whenever the store is rewritten."""
+    try:
+        with os.scandir(persist_dir) as entries:
+            return max((entry.stat().st_mtime_ns for entry in entries if entry.is_file()), default=0)
+    except FileNotFoundError:
+        return 0
+
+
+def _mmap_options():
+    return {
+        'ivf_lists': Config.VECTOR_IVF_LISTS,
+        'nprobe': Config.VECTOR_IVF_NPROBE,
+        'ivf_min_size': Config.VECTOR_IVF_MIN_SIZE,
+    }
+
+
+def load_index(persist_dir):
+    """
+    Load a persisted index, using the mmap vector store when its manifest is
+    present. The persist_dir symlink is resolved once, so a swap during the
+    load cannot mix files of two versions.
+    """
+    persist_dir = os.path.realpath(persist_dir)
+    vector_store = None
+    if is_mmap_store(persist_dir):
+        vector_store = MmapVectorStore.from_persist_dir(persist_dir, **_mmap_options())
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store)
+    return load_index_from_storage(storage_context)
+
+
+def new_index():
+    """Empty index backed by the mmap vector store."""
+    storage_context = StorageContext.from_defaults(vector_store=MmapVectorStore(**_mmap_options()))
+    return VectorStoreIndex(nodes=[], storage_context=storage_context)
+
+
+class IndexManager:
+    """
+    Owns the document index so importing the app does not deserialize it.
+
+    Modes (INDEX_LOAD):
+      lazy        load on the first query that needs it
+      background  start loading in a warm-up thread at app start
+      preload     load synchronously in create_app; under a pre-fork server
+                  started with --preload the workers share the parent's pages
+    A rewritten store is picked up by a background reload while the previous
+    index keeps serving.
+    """
+
+    def __init__(self, persist_dir, loader=None):
+        self.persist_dir = persist_dir
+        self._loader = loader or self._load_from_storage
+        self._index = None
+        self._version = None
+        self._error = None
+        self._loaded_at = None
+        self._load_seconds = None
+        self._loading = False
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def init_app(self, app):
+        mode = app.config['INDEX_LOAD']
+        if mode not in LOAD_MODES:
+            raise ValueError(f"INDEX_LOAD must be one of {LOAD_MODES}, got {mode!r}")
+        if mode == 'preload':
+            self.load()
+        elif mode == 'background':
+            self.warm_up()
+
+    def _load_from_storage(self):
+        return load_index(self.persist_dir)
+
+    def _run_load(self):
+        version = store_version(self.persist_dir)
+        started = time.monotonic()
+        try:
+            index = self._loader()
+        except Exception as e:
+            logger.exception(f"Loading vector index from {self.persist_dir} failed")
+            with self._lock:
+                self._error = str(e)
+                self._loading = False
+                self._done.notify_all()
+            return
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._index, self._version, self._error = index, version, None
+            self._loaded_at = time.time()
+            self._load_seconds = elapsed
+            self._loading = False
+            self._done.notify_all()
+        logger.info(f"Loaded vector index from {self.persist_dir} in {elapsed:.2f}s")
+
+    def _start(self):
+        """Claim the single loading slot; False if a load is already running."""
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            return True
+
+    def warm_up(self):
+        """Load (or reload) in a daemon thread."""
+        if self._start():
+            threading.Thread(target=self._run_load, name='index-warmup', daemon=True).start()
+
+    def load(self):
+        """Load now in this thread, or wait for a load already in progress."""
+        if self._start():
+            self._run_load()
+        else:
+            with self._lock:
+                self._done.wait_for(lambda: not self._loading)
+        if self._index is None:
+            raise RuntimeError(f"Vector index is not available: {self._error}")
+        return self._index
+
+    def get(self):
+        """The loaded index, loading it on first use."""
+        index = self._index
+        if index is None:
+            return self.load()
+        if not self._loading and store_version(self.persist_dir) != self._version:
+            logger.info("Vector store changed on disk, reloading in the background")
+            self.warm_up()
+        return index
+
+    def derived(self, key, build):
+        """
+        build(index) for the current index, built once and reused until a
+        reload swaps the index (query engines, retrievers).
+        """
+        index = self.get()
+        with self._lock:
+            entry = self._derived.get(key)
+            if entry is not None and entry[0] is index:
+                return entry[1]
+        value = build(index)
+        with self._lock:
+            self._derived[key] = (index, value)
+        return value
+
+    @property
+    def ready(self):
+        return self._index is not None
+
+    def version(self):
+        return self._version if self._version is not None else store_version(self.persist_dir)
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'loading': self._loading,
+            'error': self._error,
+            'persist_dir': self.persist_dir,
+            'loaded_at': self._loaded_at,
+            'load_seconds': round(self._load_seconds, 3) if self._load_seconds is not None else None,
+        }
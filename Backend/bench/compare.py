@@ -0,0 +1,57 @@
+"""
+Compare two bench.run result files metric by metric.
+
+    python -m bench.compare bench/results/base.json bench/results/new.json [--threshold 10]
+
+Lists every numeric result present in both files with the relative change;
+changes beyond the threshold (percent) are flagged.
+"""
+import argparse
+import json
+
+# Larger is better for these leaves; for everything else (latencies, seconds) smaller is
+HIGHER_IS_BETTER = ('rows_per_second', 'throughput_rps', 'recall@')
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f'{prefix}.{key}' if prefix else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = next((f'{k}={item[k]}' for k in ('concurrency', 'size') if isinstance(item, dict) and k in item),
+                         str(i))
+            yield from flatten(item, f'{prefix}[{label}]')
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent change to flag')
+    args = parser.parse_args()
+
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+    print(f"base {base['meta'].get('commit', '?')[:10]}  new {new['meta'].get('commit', '?')[:10]}")
+
+    base_values = dict(flatten(base['results']))
+    width = max((len(k) for k in base_values), default=10)
+    for key, value in flatten(new['results']):
+        if key not in base_values:
+            continue
+        old = base_values[key]
+        change = (value - old) / old * 100 if old else 0.0
+        better = change > 0 if any(marker in key for marker in HIGHER_IS_BETTER) else change < 0
+        flag = ''
+        if abs(change) >= args.threshold:
+            flag = 'better' if better else 'WORSE'
+        print(f'{key:<{width}}  {old:>14.6g}  {value:>14.6g}  {change:>+8.1f}%  {flag}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Lambda model endpoint, so benchmarks never call the
+real one. It accepts the same payloads ({"api_key", "prompt", "model_id",
+"model_params", "stream"}) and answers in the endpoint's response shape.
+
+  - embedding models get deterministic bag-of-words vectors (same text, same
+    vector; texts sharing words are close), so caches and retrieval behave
+    as they would against real embeddings
+  - the classifier, text-to-SQL and router prompts get plausible canned answers
+  - anything else gets a filler answer, streamed as NDJSON when "stream" is set
+
+Latency is latency_ms plus an exponential tail with mean jitter_ms; error_rate
+and throttle_rate turn that share of requests into 503s and 429s.
+
+    python -m bench.fake_model_server --port 8765 --latency-ms 300 --jitter-ms 100
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+SQL_WORDS = re.compile(r'\b(total|sum|count|how many|average|avg|top|by|per|most|least|number of)\b', re.I)
+DOC_WORDS = re.compile(r'\b(policy|procedure|guideline|summari[sz]e|explain|document|what does)\b', re.I)
+TOKEN = re.compile(r'[a-z0-9]+')
+FILLER = ('Orders shipped through standard class usually arrive within the scheduled window, '
+          'while late deliveries cluster in a few regions and shipping modes. ').split()
+
+CANNED_SQL = (
+    (re.compile(r'market', re.I), 'SELECT market, SUM(sales) AS total_sales FROM orders GROUP BY market'),
+    (re.compile(r'region', re.I), 'SELECT order_region, COUNT(*) AS orders FROM orders GROUP BY order_region'),
+    (re.compile(r'late|delay', re.I), 'SELECT shipping_mode, AVG(late_delivery_risk) AS late_rate '
+                                      'FROM orders GROUP BY shipping_mode'),
+    (re.compile(r'categor', re.I), 'SELECT category_name, SUM(sales) AS total_sales FROM orders '
+                                   'GROUP BY category_name ORDER BY total_sales DESC LIMIT 10'),
+)
+DEFAULT_SQL = 'SELECT COUNT(*) AS orders, SUM(sales) AS total_sales FROM orders'
+
+
+def _label(question):
+    sql, doc = bool(SQL_WORDS.search(question)), bool(DOC_WORDS.search(question))
+    if sql and doc:
+        return 'hybrid'
+    return 'sql' if sql else 'document'
+
+
+def _question(prompt, marker):
+    """Text after the last `marker` line of a prompt, or the whole prompt."""
+    index = prompt.rfind(marker)
+    return prompt[index + len(marker):].strip() if index >= 0 else prompt
+
+
+class FakeModel:
+    def __init__(self, latency_ms=200, jitter_ms=50, error_rate=0.0, throttle_rate=0.0,
+                 dim=1024, answer_words=60, token_ms=5, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.dim = dim
+        self.answer_words = answer_words
+        self.token_delay = token_ms / 1000.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._token_vectors = {}
+        self.counts = {}
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def delay(self):
+        with self._lock:
+            tail = self._random.expovariate(1 / self.jitter) if self.jitter > 0 else 0.0
+            roll = self._random.random()
+        time.sleep(self.latency + tail)
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return 200
+
+    def _token_vector(self, token):
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode('utf-8')))
+            vector = self._token_vectors[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def embed(self, text):
+        tokens = TOKEN.findall(text.lower()) or ['<empty>']
+        vector = np.sum([self._token_vector(t) for t in tokens], axis=0)
+        return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+    def complete(self, prompt):
+        if 'smart classifier' in prompt:
+            return _label(_question(prompt, 'User query:'))
+        if 'SQL for a supply-chain' in prompt:
+            question = _question(prompt, 'Question:')
+            return next((sql for pattern, sql in CANNED_SQL if pattern.search(question)), DEFAULT_SQL)
+        if 'You route and answer questions' in prompt:
+            route = _label(_question(prompt, 'Question:'))
+            answer = ' '.join(FILLER[:self.answer_words]) if route == 'document' else ''
+            return json.dumps({'route': route, 'answer': answer})
+        words = (FILLER * (self.answer_words // len(FILLER) + 1))[:self.answer_words]
+        return ' '.join(words)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    model = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.model.counts)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model_id = str(payload.get('model_id', ''))
+        prompt = str(payload.get('prompt', ''))
+        kind = 'embedding' if 'embedding' in model_id else 'completion'
+        status = self.model.delay()
+        self.model.count(f'{kind}:{status}')
+        if status == 429:
+            return self._send_json(429, {'error': 'throttled'}, {'Retry-After': '1'})
+        if status != 200:
+            return self._send_json(status, {'error': 'injected failure'})
+
+        if kind == 'embedding':
+            return self._send_json(200, {'response': {'embedding': self.model.embed(prompt)}})
+        text = self.model.complete(prompt)
+        usage = {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+        if payload.get('stream'):
+            return self._stream(text, usage)
+        self._send_json(200, {'response': {'content': [{'text': text}]}, 'usage': usage})
+
+    def _stream(self, text, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            self._chunk(json.dumps({'delta': {'text': word if i == 0 else ' ' + word}}) + '\n')
+            time.sleep(self.model.token_delay)
+        self._chunk(json.dumps({'usage': usage}) + '\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _chunk(self, line):
+        data = line.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+def start_server(host='127.0.0.1', port=0, **options):
+    """Serve in a daemon thread. Returns (server, url); server.model holds the counters."""
+    model = FakeModel(**options)
+    handler = type('BoundHandler', (Handler,), {'model': model})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.model = model
+    threading.Thread(target=server.serve_forever, name='fake-model', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/'
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--answer-words', type=int, default=60)
+    parser.add_argument('--token-ms', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_options(args):
+    return {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate, 'dim': args.dim, 'answer_words': args.answer_words,
+            'token_ms': args.token_ms, 'seed': args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, url = start_server(args.host, args.port, **server_options(args))
+    print(f'Fake model endpoint on {url} (MODEL_ENDPOINT_URL={url})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Synthetic orders CSV with the DataCo supply-chain header and value ranges,
+for ingestion and query benchmarks. Output is deterministic for a given
+seed and row count, so runs on different commits load identical data.
+
+    python -m bench.generate_csv --rows 100k --out bench/.data/orders-100k.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.utils.csv_ingest import DATE_FORMAT, ORDER_COLUMNS
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+WRITE_CHUNK = 100_000
+
+MARKETS = {
+    'LATAM': ['Central America', 'South America', 'Caribbean'],
+    'Europe': ['Western Europe', 'Northern Europe', 'Southern Europe', 'Eastern Europe'],
+    'Pacific Asia': ['Southeast Asia', 'Eastern Asia', 'Oceania', 'South Asia'],
+    'USCA': ['US Center', 'West of USA', 'East of USA', 'South of  USA', 'Canada'],
+    'Africa': ['West Africa', 'North Africa', 'East Africa', 'Southern Africa', 'Central Africa'],
+}
+CATEGORIES = ['Cleats', "Men's Footwear", "Women's Apparel", 'Indoor/Outdoor Games', 'Fishing',
+              'Water Sports', 'Camping & Hiking', 'Cardio Equipment', 'Shop By Sport', 'Electronics']
+DEPARTMENTS = ['Fitness', 'Apparel', 'Golf', 'Footwear', 'Outdoors', 'Fan Shop', 'Technology']
+SHIPPING_MODES = ['Standard Class', 'Second Class', 'First Class', 'Same Day']
+SCHEDULED_DAYS = np.array([4, 2, 1, 0])
+DELIVERY_STATUSES = ['Advance shipping', 'Late delivery', 'Shipping on time', 'Shipping canceled']
+ORDER_STATUSES = ['COMPLETE', 'PENDING', 'CLOSED', 'PENDING_PAYMENT', 'CANCELED', 'PROCESSING',
+                  'SUSPECTED_FRAUD', 'ON_HOLD', 'PAYMENT_REVIEW']
+TYPES = ['DEBIT', 'TRANSFER', 'PAYMENT', 'CASH']
+SEGMENTS = ['Consumer', 'Corporate', 'Home Office']
+CITIES = ['Caguas', 'Chicago', 'Los Angeles', 'Brooklyn', 'New York', 'Philadelphia', 'San Diego']
+COUNTRIES = ['Puerto Rico', 'EE. UU.']
+ORDER_COUNTRIES = ['Estados Unidos', 'Francia', 'México', 'Alemania', 'Australia', 'Brasil', 'Reino Unido']
+START = np.datetime64('2015-01-01T00:00')
+
+
+def parse_rows(value):
+    return SIZES.get(str(value).lower()) or int(value)
+
+
+def _frame(rng, start, n):
+    """n rows starting at row number start."""
+    market_names = list(MARKETS)
+    market = rng.integers(len(market_names), size=n)
+    region = np.empty(n, dtype=object)
+    for i, name in enumerate(market_names):
+        rows = market == i
+        region[rows] = np.array(MARKETS[name])[rng.integers(len(MARKETS[name]), size=int(rows.sum()))]
+    mode = rng.integers(len(SHIPPING_MODES), size=n)
+    scheduled = SCHEDULED_DAYS[mode]
+    real = np.clip(scheduled + rng.integers(-1, 4, size=n), 0, 6)
+    late = (real > scheduled).astype(int)
+    status = np.where(late == 1, 1, rng.choice([0, 2, 3], size=n, p=[0.45, 0.5, 0.05]))
+    category = rng.integers(len(CATEGORIES), size=n)
+    price = np.round(rng.uniform(10, 500, size=n), 2)
+    quantity = rng.integers(1, 6, size=n)
+    discount_rate = np.round(rng.choice([0, 0.05, 0.1, 0.15, 0.2, 0.25], size=n), 2)
+    sales = np.round(price * quantity, 2)
+    discount = np.round(sales * discount_rate, 2)
+    total = np.round(sales - discount, 2)
+    profit_ratio = np.round(rng.uniform(-0.8, 0.5, size=n), 2)
+    profit = np.round(total * profit_ratio, 2)
+    ordered = START + rng.integers(0, 3 * 365 * 24 * 60, size=n).astype('timedelta64[m]')
+    shipped = ordered + real.astype('timedelta64[D]')
+    customer = rng.integers(1, 20000, size=n)
+    order_id = np.arange(start + 1, start + n + 1)
+
+    values = {
+        'type': np.array(TYPES)[rng.integers(len(TYPES), size=n)],
+        'days_for_shipping_real': real,
+        'days_for_shipment_scheduled': scheduled,
+        'benefit_per_order': profit,
+        'sales_per_customer': total,
+        'delivery_status': np.array(DELIVERY_STATUSES)[status],
+        'late_delivery_risk': late,
+        'category_id': category + 1,
+        'category_name': np.array(CATEGORIES)[category],
+        'customer_city': np.array(CITIES)[rng.integers(len(CITIES), size=n)],
+        'customer_country': np.array(COUNTRIES)[rng.integers(len(COUNTRIES), size=n)],
+        'customer_email': 'XXXXXXXXX',
+        'customer_fname': 'Customer',
+        'customer_id': customer,
+        'customer_lname': 'Bench',
+        'customer_password': 'XXXXXXXXX',
+        'customer_segment': np.array(SEGMENTS)[rng.integers(len(SEGMENTS), size=n)],
+        'customer_state': 'PR',
+        'customer_street': 'Main Street',
+        'customer_zipcode': rng.integers(600, 99999, size=n),
+        'department_id': rng.integers(2, 2 + len(DEPARTMENTS), size=n),
+        'department_name': np.array(DEPARTMENTS)[rng.integers(len(DEPARTMENTS), size=n)],
+        'latitude': np.round(rng.uniform(-33, 48, size=n), 6),
+        'longitude': np.round(rng.uniform(-158, 115, size=n), 6),
+        'market': np.array(market_names)[market],
+        'order_city': np.array(CITIES)[rng.integers(len(CITIES), size=n)],
+        'order_country': np.array(ORDER_COUNTRIES)[rng.integers(len(ORDER_COUNTRIES), size=n)],
+        'order_customer_id': customer,
+        'order_date': pd.to_datetime(ordered).strftime(DATE_FORMAT),
+        'order_id': order_id,
+        'order_item_cardprod_id': category * 100 + rng.integers(1, 100, size=n),
+        'order_item_discount': discount,
+        'order_item_discount_rate': discount_rate,
+        'order_item_id': order_id,
+        'order_item_product_price': price,
+        'order_item_profit_ratio': profit_ratio,
+        'order_item_quantity': quantity,
+        'sales': sales,
+        'order_item_total': total,
+        'order_profit_per_order': profit,
+        'order_region': region,
+        'order_state': 'State',
+        'order_status': np.array(ORDER_STATUSES)[rng.integers(len(ORDER_STATUSES), size=n)],
+        'order_zipcode': '',
+        'product_card_id': category * 100 + 1,
+        'product_category_id': category + 1,
+        'product_description': '',
+        'product_image': 'http://images.example.com/product.jpg',
+        'product_name': np.array(CATEGORIES)[category],
+        'product_price': price,
+        'product_status': 0,
+        'shipping_date': pd.to_datetime(shipped).strftime(DATE_FORMAT),
+        'shipping_mode': np.array(SHIPPING_MODES)[mode],
+    }
+    return pd.DataFrame({header: values[column] for header, (column, _) in ORDER_COLUMNS.items()})
+
+
+def generate(path, rows, seed=42):
+    """Write `rows` orders to path (in blocks, so 1M rows stay within modest memory). Returns path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tmp = path + '.tmp'
+    for start in range(0, rows, WRITE_CHUNK):
+        frame = _frame(rng, start, min(WRITE_CHUNK, rows - start))
+        frame.to_csv(tmp, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def cached_csv(data_dir, rows, seed=42):
+    """Path of the generated CSV for this size, generating it on first use."""
+    path = os.path.join(data_dir, f'orders-{rows}-{seed}.csv')
+    if not os.path.exists(path):
+        generate(path, rows, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic DataCo-shaped orders CSV.')
+    parser.add_argument('--rows', default='10k', help="row count or one of 10k, 100k, 1m")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+    print(generate(args.out, parse_rows(args.rows), args.seed))
+
+
+if __name__ == '__main__':
+    main()
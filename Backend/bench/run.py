@@ -0,0 +1,148 @@
+"""
+Run the benchmark scenarios against the local fake model endpoint and save
+the results as JSON (bench/results/<timestamp>-<commit>.json by default).
+
+    python -m bench.run                                   # default suite
+    python -m bench.run --scenarios ingest --sizes 10k,100k,1m
+    python -m bench.run --scenarios query --concurrency 1,8,32 --latency-ms 400
+    python -m bench.compare bench/results/a.json bench/results/b.json
+
+Every scenario runs in a fresh interpreter with its own scratch database,
+vector store and embedding cache, so nothing under app/ is touched and runs
+do not warm each other's caches.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from bench.fake_model_server import add_arguments, server_options, start_server
+from bench.generate_csv import cached_csv, parse_rows
+from bench.scenarios import BACKEND_DIR, _parse_result
+
+BENCH_DIR = os.path.join(BACKEND_DIR, 'bench')
+DATA_DIR = os.path.join(BENCH_DIR, '.data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+DEFAULT_SCENARIOS = 'ingest,query,retrieval,coldstart'
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(args, server_url):
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'model_server': {'url': server_url, **server_options(args)},
+        'args': vars(args),
+    }
+
+
+def _run_scenario(name, params, server_url):
+    workdir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    env = {
+        **os.environ,
+        'PYTHONPATH': BACKEND_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        'MODEL_ENDPOINT_URL': server_url,
+        'DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'VECTORDIR': os.path.join(workdir, 'vector_store'),
+        'DOCS_DIR': os.path.join(workdir, 'documents'),
+        'EMBED_CACHE_PATH': os.path.join(workdir, 'embeddings.sqlite3'),
+        'SNAPSHOT_DIR': os.path.join(workdir, 'snapshots'),
+        'TRACE_LOG': '',
+    }
+    started = time.perf_counter()
+    try:
+        process = subprocess.run([sys.executable, '-m', 'bench.scenarios', name, json.dumps(params)],
+                                 cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            return {'error': process.stderr[-4000:]}
+        result = _parse_result(process.stdout)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    result['wall_seconds'] = time.perf_counter() - started
+    return result
+
+
+def _csv_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite with a local fake model endpoint.')
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS)
+    parser.add_argument('--sizes', default='10k,100k', help='ingest CSV sizes (10k, 100k, 1m or a number)')
+    parser.add_argument('--query-rows', default='10k', help='orders loaded for the query scenario')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=60, help='requests per concurrency level')
+    parser.add_argument('--mix', default='document=0.5,sql=0.4,hybrid=0.1')
+    parser.add_argument('--repeat-queries', action='store_true',
+                        help='ask the same questions verbatim, so caches answer most of them')
+    parser.add_argument('--docs', type=int, default=30, help='synthetic documents in the vector store')
+    parser.add_argument('--retrieval-sizes', default='10k,100k')
+    parser.add_argument('--retrieval-dim', type=int, default=1024)
+    parser.add_argument('--retrieval-queries', type=int, default=200)
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--coldstart-modes', default='lazy,background,preload')
+    parser.add_argument('--coldstart-runs', type=int, default=3)
+    parser.add_argument('--out', help='result file (default bench/results/<timestamp>-<commit>.json)')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, server_url = start_server(**server_options(args))
+    meta = _meta(args, server_url)
+    mix = {kind: float(share) for kind, share in (part.split('=') for part in _csv_list(args.mix))}
+    plans = {
+        'ingest': [(f'ingest[{size}]', lambda size=size: {
+            'csv_path': cached_csv(DATA_DIR, parse_rows(size)), 'rows': parse_rows(size)})
+            for size in _csv_list(args.sizes)],
+        'query': [('query', lambda: {
+            'csv_path': cached_csv(DATA_DIR, parse_rows(args.query_rows)),
+            'concurrency': _csv_list(args.concurrency, int), 'requests_per_level': args.requests,
+            'mix': mix, 'unique': not args.repeat_queries, 'docs': args.docs})],
+        'retrieval': [('retrieval', lambda: {
+            'sizes': [parse_rows(s) for s in _csv_list(args.retrieval_sizes)], 'dim': args.retrieval_dim,
+            'queries': args.retrieval_queries, 'top_k': 10, 'nprobe': args.nprobe})],
+        'coldstart': [('coldstart', lambda: {
+            'modes': _csv_list(args.coldstart_modes), 'runs': args.coldstart_runs, 'docs': args.docs})],
+    }
+
+    results = {}
+    for scenario in _csv_list(args.scenarios):
+        if scenario not in plans:
+            parser.error(f'unknown scenario {scenario!r}; choose from {", ".join(plans)}')
+        for label, params in plans[scenario]:
+            print(f'Running {label} ...', flush=True)
+            results[label] = _run_scenario(scenario, params(), server_url)
+            if 'error' in results[label]:
+                print(f'  failed:\n{results[label]["error"]}', flush=True)
+            else:
+                print(f'  done in {results[label]["wall_seconds"]:.1f}s', flush=True)
+    server.shutdown()
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{(meta['commit'] or 'nogit')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as fh:
+        json.dump({'meta': meta, 'model_server_requests': server.model.counts, 'results': results},
+                  fh, indent=2, default=str)
+    print(f'Results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
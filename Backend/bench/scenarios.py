@@ -0,0 +1,275 @@
+"""
+Benchmark scenarios. Each runs in its own process (started by bench.run)
+with the environment already pointing the app at a scratch database,
+vector store and the fake model endpoint, and prints one JSON line.
+
+    python -m bench.scenarios <name> '<json params>'
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RESULT_PREFIX = 'BENCH_RESULT '
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DOCUMENT_QUESTIONS = [
+    'Summarize the late delivery policy',
+    'Explain the procedure for returning damaged goods',
+    'What does the shipping guideline say about same day orders',
+]
+SQL_QUESTIONS = [
+    'What is the total sales by market?',
+    'How many orders per order region?',
+    'Top categories by total sales',
+]
+HYBRID_QUESTIONS = [
+    'Explain the late delivery policy and count late orders by shipping mode',
+]
+DOC_TOPICS = ['late delivery', 'returns', 'damaged goods', 'same day shipping', 'supplier onboarding',
+              'fraud review', 'warehouse safety', 'customer segments', 'discount approval', 'carrier claims']
+DOC_VOCABULARY = ('order shipment carrier warehouse customer region market policy procedure approval '
+                  'refund invoice delay schedule inventory supplier quality audit claim route').split()
+
+
+def _percentiles(values):
+    if not values:
+        return {'count': 0}
+    arr = np.asarray(values, dtype=float)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99]).tolist()
+    return {'count': len(values), 'mean': float(arr.mean()), 'p50': p50, 'p95': p95, 'p99': p99,
+            'max': float(arr.max())}
+
+
+def _stage_summary(prefix=''):
+    from app.utils.metrics import metrics
+    summary = metrics.summary('stage_seconds')
+    return {key.replace('stage=', ''): value for key, value in summary.items()
+            if key.startswith(f'stage={prefix}')}
+
+
+def _app():
+    from app import create_app
+    from app.extensions import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def write_documents(docs_dir, count=30, words=1500, seed=7):
+    """Synthetic policy documents, deterministic for a seed."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(docs_dir, exist_ok=True)
+    for i in range(count):
+        topic = DOC_TOPICS[i % len(DOC_TOPICS)]
+        body = ' '.join(rng.choice(DOC_VOCABULARY, size=words))
+        with open(os.path.join(docs_dir, f'policy-{i:03d}.txt'), 'w') as fh:
+            fh.write(f'{topic.title()} policy\n\nThis document describes the {topic} policy and procedure. {body}\n')
+
+
+def build_store(app, docs=30):
+    from app.utils.doc_ingest import ingest_documents
+    write_documents(app.config['DOCS_DIR'], count=docs)
+    started = time.perf_counter()
+    with app.app_context():
+        stats = ingest_documents()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def ingest(csv_path, rows):
+    """Throughput of load_csv_to_model on a fresh database, then the no-op rerun."""
+    from app.routes.ui_routes import load_csv_to_model
+    app = _app()
+    with app.app_context():
+        started = time.perf_counter()
+        success, errors, _ = load_csv_to_model(csv_path)
+        seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        load_csv_to_model(csv_path)
+        noop_seconds = time.perf_counter() - started
+    return {'rows': rows, 'success': success, 'errors': errors, 'seconds': seconds,
+            'rows_per_second': success / seconds if seconds else None,
+            'unchanged_rerun_seconds': noop_seconds, 'stages': _stage_summary('csv.')}
+
+
+def _serve(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def _wait_ready(base_url, timeout=120):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if requests.get(f'{base_url}/api/ready').status_code == 200:
+            return
+        time.sleep(0.1)
+    raise RuntimeError('Index did not become ready')
+
+
+def _questions(mix, count, unique, start=0):
+    pools = {'document': DOCUMENT_QUESTIONS, 'sql': SQL_QUESTIONS, 'hybrid': HYBRID_QUESTIONS}
+    weighted = [kind for kind, share in mix.items() for _ in range(int(round(share * 100)))]
+    rng = np.random.default_rng(11)
+    out = []
+    for i in range(start, start + count):
+        kind = weighted[int(rng.integers(len(weighted)))]
+        question = pools[kind][i % len(pools[kind])]
+        # A distinct suffix keeps the answer and SQL caches from serving every repeat
+        out.append((kind, f'{question} (variant {i})' if unique else question))
+    return out
+
+
+def query(csv_path, concurrency, requests_per_level, mix, unique, docs):
+    """/api/query latency and throughput under increasing concurrency, against a live threaded server."""
+    import requests
+    from app.routes.ui_routes import load_csv_to_model
+    app = _app()
+    with app.app_context():
+        load_csv_to_model(csv_path)
+    setup = {'documents': build_store(app, docs)}
+    from app.utils.llama_index import index_manager
+    # The warm-up at create_app ran before the store existed
+    index_manager.load()
+    server, base_url = _serve(app)
+    _wait_ready(base_url)
+    local = threading.local()
+
+    def ask(item):
+        kind, question = item
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        started = time.perf_counter()
+        response = session.post(f'{base_url}/api/query', json={'query': question})
+        seconds = time.perf_counter() - started
+        routed = response.json().get('type') if response.ok else None
+        return kind, routed, response.status_code, seconds
+
+    levels = []
+    try:
+        for level in concurrency:
+            # Fresh variants per level, so one level does not warm the caches for the next
+            items = _questions(mix, requests_per_level, unique, start=len(levels) * requests_per_level)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                outcomes = list(pool.map(ask, items))
+            wall = time.perf_counter() - started
+            by_kind = {}
+            for kind, _, status, seconds in outcomes:
+                if status == 200:
+                    by_kind.setdefault(kind, []).append(seconds)
+            levels.append({
+                'concurrency': level,
+                'requests': len(outcomes),
+                'errors': sum(1 for _, _, status, _ in outcomes if status != 200),
+                'misrouted': sum(1 for kind, routed, status, _ in outcomes if status == 200 and routed != kind),
+                'throughput_rps': len(outcomes) / wall,
+                'latency': _percentiles([s for _, _, status, s in outcomes if status == 200]),
+                'latency_by_type': {kind: _percentiles(values) for kind, values in sorted(by_kind.items())},
+            })
+    finally:
+        server.shutdown()
+    return {'setup': setup, 'levels': levels, 'stages': _stage_summary()}
+
+
+def retrieval(sizes, dim, queries, top_k, nprobe):
+    """MmapVectorStore query latency, exact scan against IVF, and IVF recall@k."""
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+    from app.utils.mmap_vector_store import IVFIndex, MmapVectorStore, _unit_rows
+
+    rng = np.random.default_rng(3)
+    results = []
+    for size in sizes:
+        # Clustered data, closer to real embeddings than uniform noise
+        centers = _unit_rows(rng.standard_normal((256, dim)))
+        noise = 0.5 / np.sqrt(dim)
+        vectors = _unit_rows(centers[rng.integers(256, size=size)] + noise * rng.standard_normal((size, dim)))
+        probes = _unit_rows(centers[rng.integers(256, size=queries)] + noise * rng.standard_normal((queries, dim)))
+        store = MmapVectorStore(nprobe=nprobe)
+        store._ids = [f'n{i}' for i in range(size)]
+        store._ref_doc_ids = [None] * size
+        store._vectors = vectors
+        store._deleted = np.zeros(size, dtype=bool)
+
+        def run(probe_set):
+            timings, hits = [], []
+            for probe in probe_set:
+                started = time.perf_counter()
+                result = store.query(VectorStoreQuery(query_embedding=probe.tolist(), similarity_top_k=top_k))
+                timings.append(time.perf_counter() - started)
+                hits.append(result.ids)
+            return timings, hits
+
+        exact_times, exact_hits = run(probes)
+        n_lists = max(1, int(np.sqrt(size)))
+        started = time.perf_counter()
+        store._ivf = IVFIndex.build(vectors, n_lists)
+        build_seconds = time.perf_counter() - started
+        ivf_times, ivf_hits = run(probes)
+        recall = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(exact_hits, ivf_hits)])
+        results.append({'size': size, 'dim': dim, 'exact': _percentiles(exact_times),
+                        'ivf': {**_percentiles(ivf_times), 'lists': n_lists, 'nprobe': nprobe,
+                                'build_seconds': build_seconds, f'recall@{top_k}': float(recall)}})
+    return {'sizes': results}
+
+
+CHILD_CODE = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+from app.utils.llama_index import index_manager
+index_manager.get()
+ready = time.perf_counter()
+print("BENCH_RESULT " + json.dumps({"import_seconds": imported - started,
+    "create_app_seconds": created - imported, "ready_seconds": ready - started,
+    "index_load_seconds": index_manager.status()["load_seconds"]}))
+'''
+
+
+def coldstart(modes, runs, docs):
+    """Process start to a usable index, for each INDEX_LOAD mode (fresh interpreter per run)."""
+    app = _app()
+    setup = {'documents': build_store(app, docs)}
+    results = {}
+    for mode in modes:
+        samples = []
+        for _ in range(runs):
+            env = {**os.environ, 'INDEX_LOAD': mode}
+            output = subprocess.run([sys.executable, '-c', CHILD_CODE], cwd=BACKEND_DIR, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(_parse_result(output))
+        results[mode] = {key: _percentiles([s[key] for s in samples if s[key] is not None])
+                         for key in samples[0]}
+    return {'setup': setup, 'modes': results}
+
+
+def _parse_result(output):
+    for line in reversed(output.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f'No result in output:\n{output[-2000:]}')
+
+
+SCENARIOS = {'ingest': ingest, 'query': query, 'retrieval': retrieval, 'coldstart': coldstart}
+
+
+def main():
+    name, params = sys.argv[1], json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+    result = SCENARIOS[name](**params)
+    print(RESULT_PREFIX + json.dumps(result, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""analytic indexes on orders
+
+Revision ID: 0001_normalized_star_schema
+Revises:
+Create Date: 2026-10-18 09:10:00.000000
+
+The base tables (user, role, orders, ...) predate migrations and are created by
+db.create_all(), so every step here checks what exists first.
+
+This revision used to add a normalized star schema (locations, customers,
+departments, categories, products, order_items, shipping_details) backfilled
+from orders. Nothing wrote or read those tables afterwards, so they are gone;
+the revision id is kept for databases already stamped with it. Tables an older
+create_all() left behind are dropped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_normalized_star_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+ORDER_INDEXES = [
+    'order_date', 'market', 'order_region', 'category_id',
+    'customer_id', 'delivery_status', 'shipping_mode',
+]
+
+# Children first, so foreign keys never point at a dropped table
+NORMALIZED_TABLES = [
+    'shipping_details', 'order_items', 'products', 'categories',
+    'departments', 'customers', 'locations',
+]
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _tables()
+    if 'orders' not in existing:
+        raise RuntimeError("orders table not found; start the app once (db.create_all) before migrating")
+
+    order_indexes = _indexes('orders')
+    for column in ORDER_INDEXES:
+        name = f'ix_orders_{column}'
+        if name not in order_indexes:
+            op.create_index(name, 'orders', [column])
+
+    for table in NORMALIZED_TABLES:
+        if table in existing:
+            op.drop_table(table)
+
+
+def downgrade():
+    order_indexes = _indexes('orders')
+    for column in ORDER_INDEXES:
+        name = f'ix_orders_{column}'
+        if name in order_indexes:
+            op.drop_index(name, table_name='orders')
@@ -0,0 +1,53 @@
+"""job leases and database de-duplication
+
+Revision ID: 0002_job_leases
+Revises: 0001_normalized_star_schema
+Create Date: 2026-10-18 12:40:00.000000
+
+jobs predates migrations and is created by db.create_all(), which adds the new
+columns itself on fresh databases, so every step checks what exists first.
+Running jobs from before this revision have no lease and can be reclaimed by
+`flask jobs worker` / `flask jobs resume` straight away.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_job_leases'
+down_revision = '0001_normalized_star_schema'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'jobs' not in sa.inspect(op.get_bind()).get_table_names():
+        return
+    columns = _columns('jobs')
+    if 'lease_expires_at' not in columns:
+        op.add_column('jobs', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    if 'active_key' not in columns:
+        op.add_column('jobs', sa.Column('active_key', sa.String(40), nullable=True))
+    indexes = _indexes('jobs')
+    if 'ix_jobs_lease_expires_at' not in indexes:
+        op.create_index('ix_jobs_lease_expires_at', 'jobs', ['lease_expires_at'])
+    if 'ix_jobs_active_key' not in indexes:
+        op.create_index('ix_jobs_active_key', 'jobs', ['active_key'], unique=True)
+
+
+def downgrade():
+    indexes = _indexes('jobs')
+    for name in ('ix_jobs_active_key', 'ix_jobs_lease_expires_at'):
+        if name in indexes:
+            op.drop_index(name, table_name='jobs')
+    with op.batch_alter_table('jobs') as batch:
+        batch.drop_column('active_key')
+        batch.drop_column('lease_expires_at')
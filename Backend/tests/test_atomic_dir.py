@@ -0,0 +1,34 @@
+import os
+
+from app.utils.atomic_dir import publish_directory, staging_directory
+
+
+def publish(target, content):
+    staged = staging_directory(target)
+    with open(os.path.join(staged, 'data'), 'w') as fh:
+        fh.write(content)
+    return publish_directory(staged, target)
+
+
+def read(target):
+    with open(os.path.join(target, 'data')) as fh:
+        return fh.read()
+
+
+def test_publish_swaps_versions_and_keeps_only_the_previous_one(tmp_path):
+    target = tmp_path / 'store'
+    target.mkdir()
+    (target / 'data').write_text('legacy')
+
+    first = publish(str(target), 'one')
+    assert os.path.islink(target) and read(target) == 'one'
+
+    second = publish(str(target), 'two')
+    third = publish(str(target), 'three')
+
+    assert read(target) == 'three'
+    assert os.path.realpath(target) == third
+    assert os.path.isdir(second)
+    assert not os.path.exists(first)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ['store', os.path.basename(second), os.path.basename(third)])
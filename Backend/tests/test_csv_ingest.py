@@ -0,0 +1,101 @@
+import csv
+
+import pytest
+from flask import Flask
+
+from app.extensions import db
+from app.models.user import Order
+from app.utils.csv_ingest import ORDER_COLUMNS, bump_data_version, data_version, incremental_load_orders
+
+NUMERIC_KINDS = {'int': '1', 'float': '1.5', 'date': '1/31/2018 22:56'}
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'orders.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def row(order_id, item_id, sales):
+    values = {col: NUMERIC_KINDS.get(kind, 'x') for col, (_, kind) in ORDER_COLUMNS.items()}
+    values.update({'Order Id': str(order_id), 'Order Item Id': str(item_id), 'Sales': str(sales)})
+    return values
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(ORDER_COLUMNS))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def stored(order_id):
+    return Order.query.filter_by(order_id=order_id).one()
+
+
+def test_first_row_of_an_order_wins_across_chunk_boundaries(app, tmp_path):
+    path = tmp_path / 'orders.csv'
+    # Order 2 starts at the end of the first chunk and continues in the second
+    write_csv(path, [row(1, 10, 100), row(2, 20, 200), row(2, 21, 210), row(3, 30, 300)])
+
+    success, errors, _ = incremental_load_orders(str(path), chunk_size=2)
+
+    assert (success, errors) == (3, 0)
+    assert (stored(2).order_item_id, stored(2).sales) == (20, 200)
+
+
+def test_changed_rerun_updates_the_first_row_only(app, tmp_path):
+    path = tmp_path / 'orders.csv'
+    write_csv(path, [row(1, 10, 100), row(2, 20, 200), row(2, 21, 210), row(3, 30, 300)])
+    incremental_load_orders(str(path), chunk_size=2)
+
+    # Only the second chunk changed: the first chunk is skipped as unchanged,
+    # and the later item of order 2 must not overwrite the stored order
+    write_csv(path, [row(1, 10, 100), row(2, 20, 200), row(2, 21, 999), row(3, 30, 333)])
+    incremental_load_orders(str(path), chunk_size=2)
+
+    assert (stored(2).order_item_id, stored(2).sales) == (20, 200)
+    assert stored(3).sales == 333
+
+
+def test_error_rows_are_csv_line_numbers_despite_blank_lines(app, tmp_path):
+    path = tmp_path / 'orders.csv'
+    write_csv(path, [row(1, 10, 100)])
+    with open(path, 'a', newline='') as fh:
+        fh.write('\n\n')
+        csv.DictWriter(fh, fieldnames=list(ORDER_COLUMNS)).writerows([row(2, 20, 'bad'), row(3, 30, 300)])
+
+    _, _, errors = incremental_load_orders(str(path), chunk_size=2)
+
+    assert [(e['row'], e['order_id']) for e in errors] == [(5, 2)]
+
+
+def test_appended_tail_keeps_counting_file_lines(app, tmp_path):
+    path = tmp_path / 'orders.csv'
+    write_csv(path, [row(1, 10, 100), row(2, 20, 200)])
+    with open(path, 'a', newline='') as fh:
+        fh.write('\n')
+    incremental_load_orders(str(path), chunk_size=2)
+
+    with open(path, 'a', newline='') as fh:
+        csv.DictWriter(fh, fieldnames=list(ORDER_COLUMNS)).writerows([row(3, 30, 300), row(4, 40, 'bad')])
+    success, _, errors = incremental_load_orders(str(path), chunk_size=2)
+
+    assert success == 1
+    assert [(e['row'], e['order_id']) for e in errors] == [(6, 4)]
+
+
+def test_data_version_changes_only_when_bumped(app, tmp_path):
+    path = tmp_path / 'orders.csv'
+    write_csv(path, [row(1, 10, 100)])
+    before = data_version()
+
+    incremental_load_orders(str(path))
+    assert data_version() == before
+
+    bump_data_version(str(path))
+    assert data_version() != before
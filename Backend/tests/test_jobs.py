@@ -0,0 +1,46 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app.extensions import db
+from app.models.user import Job
+from app.utils.jobs import JobRunner
+
+
+@pytest.fixture
+def runner(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'jobs.db'}",
+                      JOB_WORKERS=1, JOB_LEASE_SECONDS=60)
+    db.init_app(app)
+    runner = JobRunner(app)
+    release = threading.Event()
+    runner.register('block')(lambda progress, **params: release.wait(10))
+    with app.app_context():
+        db.create_all()
+        yield runner
+        release.set()
+        runner.shutdown(wait=True)
+
+
+def test_enqueue_once_deduplicates_in_the_database(runner):
+    first = runner.enqueue_once('block', a=1, b=2)
+    # Same params in another order: a different params string, but the same active_key
+    second = runner.enqueue_once('block', b=2, a=1)
+
+    assert second.id == first.id
+    assert Job.query.count() == 1
+
+
+def test_only_lapsed_leases_are_reclaimed(runner):
+    now = datetime.utcnow()
+    live = Job(kind='block', status='running', lease_expires_at=now + timedelta(minutes=1))
+    lapsed = Job(kind='block', status='running', lease_expires_at=now - timedelta(minutes=1))
+    db.session.add_all([live, lapsed])
+    db.session.commit()
+
+    assert not runner._claim(live.id)
+    assert runner._claim(lapsed.id)
+    assert not runner._claim(lapsed.id)
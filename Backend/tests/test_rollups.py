@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.rollups import rollup_sql
+
+
+@pytest.mark.parametrize('question', [
+    'total sales by market for Europe',
+    'total sales by market for europe',
+    'total sales by market last year',
+    'total sales by market in 2017',
+    'average profit by market',
+    'sales by category for furniture only',
+])
+def test_filters_the_cube_cannot_apply_fall_through(question):
+    assert rollup_sql(question) is None
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('total sales by market', 'GROUP BY market'),
+    ('What is the total sales by market?', 'GROUP BY market'),
+    ('How many orders per order region?', 'SUM(order_count) AS order_count'),
+    ('Top 5 categories by total sales', 'LIMIT 5'),
+    ('late delivery rate by shipping mode', 'late_delivery_rate'),
+    ('average shipping delay per market', 'avg_shipping_delay_days'),
+    ('number of orders by shipping mode and year', 'GROUP BY shipping_mode, order_year'),
+])
+def test_measure_by_dimension_questions_use_the_cube(question, expected):
+    sql = rollup_sql(question)
+    assert sql is not None and expected in sql
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DatabaseError
+
+from app.utils.langchain_sql import UnsafeSQLError, _apply_limits, validate_sql
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT email, password FROM orders, user',
+    'SELECT * FROM "user"',
+    'select name, sql from "sqlite_master"',
+    'SELECT * FROM user',
+    'SELECT * FROM `user`',
+    'SELECT * FROM main."user"',
+    'SELECT * FROM orders o JOIN [role] r ON 1 = 1',
+    'SELECT * FROM orders WHERE market IN (SELECT email FROM "user")',
+    'SELECT * FROM (SELECT * FROM orders), user',
+])
+def test_rejects_tables_outside_allow_list(sql):
+    with pytest.raises(UnsafeSQLError):
+        validate_sql(sql)
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT market, SUM(sales) FROM orders GROUP BY market',
+    'SELECT o.market FROM orders AS o, order_rollups r WHERE o.market = r.market',
+    'WITH t AS (SELECT market FROM orders) SELECT * FROM t',
+    'SELECT EXTRACT(YEAR FROM order_date) FROM orders',
+    "SELECT * FROM orders WHERE customer_city = 'from user'",
+])
+def test_accepts_allowed_tables(sql):
+    assert validate_sql(sql)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE orders (market TEXT)')
+        conn.exec_driver_sql('CREATE TABLE user (email TEXT, password TEXT)')
+    return engine
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT email, password FROM orders, user',
+    'SELECT * FROM "user"',
+    'select name, sql from "sqlite_master"',
+])
+def test_sqlite_authorizer_denies_reads_outside_allow_list(engine, sql):
+    with engine.connect() as conn:
+        cleanup = _apply_limits(conn, timeout=5)
+        try:
+            with pytest.raises(DatabaseError):
+                conn.execute(text(sql))
+        finally:
+            conn.rollback()
+            cleanup()
+        # The connection is usable again once the limits are lifted
+        assert conn.execute(text('SELECT COUNT(*) FROM user')).scalar() == 0
+
+
+def test_sqlite_authorizer_allows_allowed_tables(engine):
+    with engine.connect() as conn:
+        cleanup = _apply_limits(conn, timeout=5)
+        try:
+            sql = 'WITH t AS (SELECT market FROM orders) SELECT COUNT(*) FROM (SELECT * FROM t) AS q LIMIT 1'
+            assert conn.execute(text(sql)).scalar() == 0
+        finally:
+            conn.rollback()
+            cleanup()